@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Headless batch mode: analyze every SRS document of a directory or manifest
+# without the API server. Each document gets its own directory under the
+# output directory (its workspace) holding the generated project, the docs
+# and result.json. A summary line per document is appended to summary.jsonl.
+# Documents that already have a successful result.json are skipped, so an
+# interrupted batch is resumed by running the same command again.
+
+RESULT_FILE = "result.json"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a batch of SRS documents")
+    parser.add_argument(
+        "inputs", nargs="+",
+        help="Directories of .docx files, .docx files, or manifests listing one document path "
+             "per line (.jsonl manifests: one {\"path\": ...} object per line)",
+    )
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Directory for the per-document results")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Documents analyzed at once")
+    parser.add_argument(
+        "--executor", choices=["process", "thread"], default="process",
+        help="Run documents in worker processes or in threads of this process",
+    )
+    parser.add_argument(
+        "--llm-rpm", type=float, default=float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "0")),
+        help="LLM requests per minute shared by all workers, 0 for no limit",
+    )
+    parser.add_argument("--summary", help="Summary JSONL file, defaults to <output dir>/summary.jsonl")
+    parser.add_argument("--force", action="store_true", help="Analyze documents again even if they have a result")
+    return parser.parse_args(argv)
+
+
+def collect_documents(inputs):
+    """Expand the inputs into the list of .docx paths to analyze"""
+    documents = []
+    for item in inputs:
+        if os.path.isdir(item):
+            documents += sorted(
+                os.path.join(item, name) for name in os.listdir(item)
+                if name.lower().endswith(".docx") and not name.startswith("~$")
+            )
+        elif item.lower().endswith(".docx"):
+            documents.append(item)
+        else:
+            documents += read_manifest(item)
+
+    seen = set()
+    unique = []
+    for path in documents:
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def read_manifest(path):
+    """Read the document paths of a manifest, relative paths are relative to the manifest"""
+    base = os.path.dirname(os.path.abspath(path))
+    documents = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["path"]
+            documents.append(os.path.join(base, line))
+    return documents
+
+
+def workspace_ids(documents):
+    """One workspace id per document, derived from its file name"""
+    ids = {}
+    used = set()
+    for path in documents:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = re.sub(r'[^A-Za-z0-9_-]+', "_", stem).strip("_") or "document"
+        candidate = name
+        n = 2
+        while candidate in used:
+            candidate = f"{name}_{n}"
+            n += 1
+        used.add(candidate)
+        ids[path] = candidate
+    return ids
+
+
+def load_result(result_path):
+    try:
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_worker(rate_limiter):
+    """Make the worker's LLM calls draw from the batch's shared request budget"""
+    if rate_limiter is not None:
+        from utils.groq_llm import set_rate_limiter
+        set_rate_limiter(rate_limiter)
+
+
+def analyze_document(path, workspace_id):
+    """
+    Analyze one document and write its result.json
+
+    Returns:
+        The document's summary line
+    """
+    from pipeline import run_analysis
+    from utils.checkpoint import document_hash, run_id_for, pipeline_config
+    from utils.preprocess import read_srs
+    from utils.single_flight import single_flight
+    from utils.workspace import workspace_paths
+
+    start = time.perf_counter()
+    summary = {"document": path, "workspace": workspace_id, "run_id": None}
+    try:
+        read_start = time.perf_counter()
+        srs_text, srs_sections = read_srs(path)
+        read_seconds = round(time.perf_counter() - read_start, 3)
+
+        # Identical documents in the batch share one run
+        run_id = run_id_for(document_hash(srs_text), pipeline_config())
+        summary["run_id"] = run_id
+        result = single_flight(
+            run_id, lambda: run_analysis(srs_text, srs_sections, os.path.basename(path), workspace_id)
+        )
+
+        root = workspace_paths(workspace_id)["root"]
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, RESULT_FILE), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+        summary["status"] = result.get("status", "error")
+        summary["timings"] = {"read": read_seconds, **result.get("run", {}).get("timings", {})}
+        if summary["status"] != "success":
+            summary["error"] = result.get("message")
+    except Exception as e:
+        summary["status"] = "error"
+        summary["error"] = str(e)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    # Must be set before the pipeline modules read the configuration, the
+    # worker processes inherit it
+    os.environ["WORKSPACE_ROOT"] = output_dir
+
+    from utils.rate_limit import RateLimiter
+
+    documents = collect_documents(args.inputs)
+    ids = workspace_ids(documents)
+    summary_path = args.summary or os.path.join(output_dir, "summary.jsonl")
+
+    pending = []
+    skipped = []
+    for path in documents:
+        previous = load_result(os.path.join(output_dir, ids[path], RESULT_FILE))
+        if not args.force and previous and previous.get("status") == "success":
+            skipped.append({
+                "document": path,
+                "workspace": ids[path],
+                "run_id": previous.get("run", {}).get("id"),
+                "status": "skipped",
+            })
+        else:
+            pending.append(path)
+    print(f"📄 {len(documents)} documents, {len(skipped)} already analyzed, {len(pending)} to analyze")
+
+    rate_limiter = RateLimiter(args.llm_rpm) if args.llm_rpm > 0 else None
+    executor_class = ProcessPoolExecutor if args.executor == "process" else ThreadPoolExecutor
+    failed = 0
+    with open(summary_path, "a", encoding="utf-8") as summary_file:
+        for line in skipped:
+            summary_file.write(json.dumps(line) + "\n")
+        summary_file.flush()
+
+        with executor_class(
+            max_workers=max(1, args.workers), initializer=init_worker, initargs=(rate_limiter,)
+        ) as executor:
+            futures = {executor.submit(analyze_document, path, ids[path]): path for path in pending}
+            for future in as_completed(futures):
+                try:
+                    line = future.result()
+                except Exception as e:  # the worker process died
+                    line = {"document": futures[future], "workspace": ids[futures[future]], "status": "error", "error": str(e)}
+                if line["status"] == "success":
+                    print(f"✅ {line['document']} analyzed in {line['seconds']}s")
+                else:
+                    failed += 1
+                    print(f"❌ {line['document']}: {line.get('error')}")
+                # Written as documents finish so an interrupted batch keeps its summary
+                summary_file.write(json.dumps(line) + "\n")
+                summary_file.flush()
+
+    print(f"Summary written to {summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,25 +4,44 @@ from nodes.extract_logic import extract_logic_node
 from nodes.extract_auth import extract_auth_node
 from nodes.extract_db_data import extract_db_data_node
 from nodes.project_setup import setup_node
+from utils.incremental import reuse_unchanged
+from utils.output_schema import validated
+from utils.config import GENERATION_PROFILE
 
 from typing import TypedDict, Optional
 
 # Define your state properly using TypedDict
 class MyStateGraph(TypedDict):
     srs_text: str
+    srs_sections: Optional[list]
     api_endpoints: Optional[str]
     auth_requirements: Optional[str]
     db_schema: Optional[str]
     business_logic: Optional[str]
     setup: Optional[str]
+    # Incremental re-analysis: stored analysis of the previous version of the
+    # document, hash of every node's inputs and per-file generation cache
+    previous_analysis: Optional[dict]
+    node_inputs: Optional[dict]
+    generation_cache: Optional[dict]
 
-def build_langgraph():
+def build_langgraph(checkpointer=None):
     builder = StateGraph(MyStateGraph)
-    builder.add_node("extract_api", extract_api_node)
-    builder.add_node("extract_logic", extract_logic_node)
-    builder.add_node("extract_auth", extract_auth_node)
-    builder.add_node("extract_db_schema", extract_db_data_node)
-    builder.add_node("project_setup", setup_node)
+    builder.add_node("extract_api", reuse_unchanged(
+        "extract_api", "api_endpoints", validated("api_endpoints", extract_api_node), topic="api"))
+    builder.add_node("extract_logic", reuse_unchanged(
+        "extract_logic", "business_logic", validated("business_logic", extract_logic_node), topic="logic",
+        depends_on=("api_endpoints",)))
+    builder.add_node("extract_auth", reuse_unchanged(
+        "extract_auth", "auth_requirements", validated("auth_requirements", extract_auth_node), topic="auth",
+        depends_on=("api_endpoints", "business_logic")))
+    builder.add_node("extract_db_schema", reuse_unchanged(
+        "extract_db_schema", "db_schema", validated("db_schema", extract_db_data_node), topic="db",
+        depends_on=("api_endpoints", "business_logic")))
+    builder.add_node("project_setup", reuse_unchanged(
+        "project_setup", "setup", validated("setup", setup_node),
+        depends_on=("api_endpoints", "business_logic", "auth_requirements", "db_schema"),
+        version=GENERATION_PROFILE))
 
     builder.set_entry_point("extract_api")
     builder.add_edge("extract_api", "extract_logic")
@@ -31,4 +50,4 @@ def build_langgraph():
     builder.add_edge("extract_db_schema","project_setup")
     builder.set_finish_point("project_setup")
 
-    return builder.compile()
\ No newline at end of file
+    return builder.compile(checkpointer=checkpointer)
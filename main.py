@@ -1,13 +1,19 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from utils.preprocess import read_docx
-from graph_builder import build_langgraph
-from utils.db import create_tables_from_schema
-from utils.project_generator import generate_project_structure, setup_virtual_env
-from utils.documentation import generate_project_documentation
-import tempfile
-import shutil
-import json
+from fastapi.responses import FileResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from utils.preprocess import read_srs
+from pipeline import run_analysis
+from utils.config import MAX_UPLOAD_BYTES, PROFILING_ADMIN_TOKEN
+from utils import metrics
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.checkpoint import document_hash, run_id_for, pipeline_config
+from utils.single_flight import single_flight
+from utils.workspace import get_workspace, directory_size, start_gc_thread
+from utils.profiling import PROFILE_DIR, ProfileSession, ProfilingBusy, span
+import hmac
+import zipfile
+from xml.etree.ElementTree import ParseError
 import os
 
 
@@ -26,77 +32,115 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+admission = AdmissionController()
+
+@app.on_event("startup")
+def start_workspace_gc():
+    start_gc_thread()
+
+def read_upload(file: UploadFile):
+    """Read the text and section index of an uploaded .docx, enforcing MAX_UPLOAD_BYTES"""
+    upload = file.file
+    upload.seek(0, os.SEEK_END)
+    size = upload.tell()
+    upload.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large: {size} bytes, the limit is {MAX_UPLOAD_BYTES} bytes",
+        )
+    try:
+        return read_srs(upload)
+    except (zipfile.BadZipFile, KeyError, ParseError):
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid .docx document")
+
+def is_admin(request: Request):
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(PROFILING_ADMIN_TOKEN) and hmac.compare_digest(token.encode(), PROFILING_ADMIN_TOKEN.encode())
+
+def profiling_requested(request: Request):
+    flag = request.query_params.get("profile") or request.headers.get("X-Profile") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+def analyze_upload(file: UploadFile):
+    """Parse an upload and analyze it, sharing the run with concurrent uploads of the same document"""
+    # Read SRS text straight from the spooled upload buffer
+    with span("read_upload"):
+        srs_text, srs_sections = read_upload(file)
+    # Concurrent uploads of the same document under the same settings share a single run
+    run_id = run_id_for(document_hash(srs_text), pipeline_config())
+    with span("analysis", run_id=run_id):
+        return run_id, single_flight(run_id, lambda: run_analysis(srs_text, srs_sections, file.filename))
+
+def analyze_profiled(file: UploadFile):
+    """analyze_upload under the profiler, the artifacts are saved in the run's workspace"""
+    with ProfileSession() as session:
+        run_id, result = session.call(lambda: analyze_upload(file))
+    workspace = get_workspace(result.get("workspace", {}).get("id") or run_id)
+    if workspace is None:
+        return {**result, "profile": {**session.summary(), "message": "No workspace to store the profile in"}}
+    artifacts = session.save(os.path.join(workspace["root"], PROFILE_DIR))
+    print(f"🔬 Profile of {run_id} saved in {workspace['root']}")
+    return {
+        **result,
+        "profile": {
+            **session.summary(),
+            **{kind: f"/workspaces/{workspace['id']}/profile/{name}" for kind, name in artifacts.items()},
+        },
+    }
+
 @app.post("/analyze-srs")
 
-async def analyze_srs(file: UploadFile = File(...)):
-    # Save file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
-
-    # Read SRS text from .docx
-    srs_text = read_docx(tmp_path)
-    # Step 1: Initialize graph
-    graph = build_langgraph()
-    # Step 2: Run the LangGraph
-    final_state = graph.invoke({"srs_text": srs_text})
-    print("===========================================================")
-    print(final_state["setup"])
-     # Step 3: Parse db_schema
+async def analyze_srs(request: Request, file: UploadFile = File(...)):
+    profiled = profiling_requested(request)
+    if profiled and not is_admin(request):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid X-Admin-Token")
+    # Shed load rather than let every request time out
+    client_id = request.headers.get("X-Client-Id") or (request.client.host if request.client else "unknown")
     try:
-        db_schema_dict = json.loads(final_state["db_schema"])
-        
-        print("===========================================================")
-        print(final_state["setup"])
-        # Step 4: Create tables in PostgreSQL
-        create_tables_from_schema(db_schema_dict)
-        
-        # Step 5: Generate project structure
-        project_dir = os.path.join(os.getcwd(), "generated_project")
-        print("===========================================================")
-        print(final_state["setup"])
-        success, message = generate_project_structure(final_state["setup"], project_dir)
-        
-        # Step 6: Set up virtual environment
-        if success:
-            env_success, env_message = setup_virtual_env(project_dir)
-        else:
-            env_success = False
-            env_message = "Skipped due to project generation failure"
-
-         # Step 7: Generate documentation
-        doc_files = generate_project_documentation(final_state)
-            
-        return {
-            "status": "success",
-            "api_endpoints": json.loads(final_state["api_endpoints"]),
-            "business_logic": final_state["business_logic"],
-            "auth_requirements": final_state["auth_requirements"],
-            "db_schema": db_schema_dict,
-            "project_generation": {
-                "success": success,
-                "message": message,
-                "virtual_env": {
-                    "success": env_success,
-                    "message": env_message
-                }
-            },
-             "documentation": {
-                "readme": f"/docs/static/{os.path.basename(doc_files['readme'])}",
-                "api_documentation": f"/docs/static/{os.path.basename(doc_files['api_doc'])}",
-                "workflow_diagram": f"/docs/static/{os.path.basename(doc_files['workflow_diagram'])}",
-                "workflow_graph": f"/docs/static/{os.path.basename(doc_files['workflow_graph'])}"
-            }
-        }
-    except json.JSONDecodeError as e:
-        return {
-            "status": "error", 
-            "message": f"Failed to parse JSON: {str(e)}",
-            "raw_db_schema": final_state["db_schema"]
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Failed to process: {str(e)}",
-            "db_schema": final_state.get("db_schema", "Not available")
-        }
\ No newline at end of file
+        async with admission.admit(client_id):
+            try:
+                if profiled:
+                    # Parsing runs in the profiled thread too
+                    return await run_in_threadpool(analyze_profiled, file)
+                _, result = await run_in_threadpool(analyze_upload, file)
+                return result
+            finally:
+                await file.close()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ProfilingBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/workspaces/{workspace_id}")
+async def workspace_info(workspace_id: str):
+    workspace = get_workspace(workspace_id)
+    if workspace is None:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    return {
+        **workspace,
+        "size_bytes": await run_in_threadpool(directory_size, workspace["root"]),
+        "docs": sorted(os.listdir(workspace["docs_dir"])) if os.path.isdir(workspace["docs_dir"]) else [],
+    }
+
+@app.get("/workspaces/{workspace_id}/docs/{name}")
+async def workspace_doc(workspace_id: str, name: str):
+    workspace = get_workspace(workspace_id)
+    path = os.path.join(workspace["docs_dir"], os.path.basename(name)) if workspace else None
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return FileResponse(path)
+
+@app.get("/workspaces/{workspace_id}/profile/{name}")
+async def workspace_profile(request: Request, workspace_id: str, name: str):
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Profiles require a valid X-Admin-Token")
+    workspace = get_workspace(workspace_id)
+    path = os.path.join(workspace["root"], PROFILE_DIR, os.path.basename(name)) if workspace else None
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.render_prometheus()
@@ -1,4 +1,5 @@
 from utils.groq_llm import llama3_chat
+from utils.preprocess import relevant_srs_text
 import json
 import re
 
@@ -6,10 +7,10 @@ def extract_api_node(state):
     prompt = f"""From the following SRS,extract all the REST API endpoints with HTTP method, path, and parameter.Respond in JSON format.
     Just extract the API endpoints, do not include any other information and give json only dont add any other text.
     SRS:
-    {state['srs_text']}
+    {relevant_srs_text(state, 'api')}
     """
 
-    res = llama3_chat(prompt)
+    res = llama3_chat(prompt, node="extract_api")
     
     # Clean up the response to extract the actual JSON
     cleaned_json = extract_json_from_text(res)
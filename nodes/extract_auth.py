@@ -1,4 +1,5 @@
 from utils.groq_llm import llama3_chat
+from utils.preprocess import relevant_srs_text
 import json
 import re
 
@@ -6,13 +7,16 @@ def extract_auth_node(state):
     prompt = f"""Extract authentication and authorization methods from the following SRS. Use JSON format for the response.
         Just extract the authentication and authorization methods, do not include any other information and give json only dont add any other text.
 
+    SRS:
+    {relevant_srs_text(state, 'auth')}
+
     API Definitions:
     {state['api_endpoints']}
     Business Logic:
     {state['business_logic']}
     """
 
-    res = llama3_chat(prompt)
+    res = llama3_chat(prompt, node="extract_auth")
     
     # Clean up the response to extract the actual JSON
     cleaned_json = extract_json_from_text(res)
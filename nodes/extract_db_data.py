@@ -1,13 +1,41 @@
 from utils.groq_llm import llama3_chat
+from utils.preprocess import relevant_srs_text
+from utils.incremental import seed_output
 import re
 import json
 
 def extract_db_data_node(state):
+    seed = seed_output(state, "db_schema", "db")
+    if seed:
+        # Most of the schema is known, only send what changed
+        previous_schema, changed_text, removed = seed
+        prompt = f"""Below is the database schema extracted from a previous version of an SRS, followed by the SRS sections that were added or changed since.
+    Update the schema so it matches the new sections: add, change or remove tables, columns and relationships as they require, and keep everything else exactly as it is.
+    Tables that only came from the removed sections should be removed. Respond with the complete updated schema in the same JSON format, give json only dont add any other text.
+    Previous schema:
+    {previous_schema}
+
+    Changed SRS sections:
+    {changed_text or "None"}
+
+    Removed SRS sections:
+    {", ".join(removed) or "None"}
+
+    API Definitions:
+    {state['api_endpoints']}
+
+    Business Logic:
+    {state['business_logic']}
+
+    """
+        res = llama3_chat(prompt, node="extract_db_schema")
+        return {"db_schema": extract_json_from_text(res), **state}
+
     prompt = f"""From the following SRS, extract all the database schema: tables, columns, and relationships. Respond in JSON format.
     Do not generate answers from general knowledge. If no database schema is present, respond with "No database schema found".
     Just extract the database schema, do not include any other information and give json only dont add any other text.
     SRS:
-    {state['srs_text']}
+    {relevant_srs_text(state, 'db')}
 
     API Definitions:
     {state['api_endpoints']}
@@ -17,7 +45,7 @@ def extract_db_data_node(state):
 
     """
 
-    res = llama3_chat(prompt)
+    res = llama3_chat(prompt, node="extract_db_schema")
     
     # Clean up the response to extract the actual JSON
     cleaned_json = extract_json_from_text(res)
@@ -1,4 +1,5 @@
 from utils.groq_llm import llama3_chat
+from utils.preprocess import relevant_srs_text
 import json
 import re
 
@@ -8,13 +9,13 @@ def extract_logic_node(state):
     Just extract the business logic, do not include any other information and give json only dont add any other text.
     
     SRS:
-    {state.get('srs_text', '')}
+    {relevant_srs_text(state, 'logic')}
     
     API Definitions:
     {state['api_endpoints']}
     """
 
-    res = llama3_chat(prompt)
+    res = llama3_chat(prompt, node="extract_logic")
     
     # Clean up the response to extract the actual JSON
     cleaned_json = extract_json_from_text(res)
@@ -1,42 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
 from utils.groq_llm import llama3_chat
+from utils.config import PROJECT_GEN_MAX_WORKERS, PROJECT_GEN_FILE_MAX_TOKENS, GENERATION_PROFILE
+from utils.templates import render_boilerplate, render_services, async_violations
+from utils.incremental import input_hash
+from utils.output_schema import validate_output
+from utils.profiling import propagate
 import json
+import os
 import re
 
+# Tries of the LLM call writing one file before it is reported as failed
+FILE_GENERATION_ATTEMPTS = 2
+
+ASYNC_GUIDELINES = """Database access is asynchronous: functions that touch the database are declared with async def and
+    take the AsyncSession from get_session as their session argument. Query with select() and await session.execute(),
+    await session.get(), flush(), refresh(), delete() and commit(). Never use session.query, create_engine or sessionmaker."""
+
 def setup_node(state):
     api_endpoints = state.get("api_endpoints", "")
     business_logic = state.get("business_logic", "")
     auth_requirements = state.get("auth_requirements", "")  
     db_schema = state.get("db_schema", "")
 
+    analysis = f"""
+    API Definitions:
+    {api_endpoints}
+    BUSINESS LOGIC:
+    {business_logic}
+    AUTHENTICATION AND AUTHORIZATION:
+    {auth_requirements}
+    DATABASE SCHEMA:
+    {db_schema}
+    """
+
+    # Boilerplate (database, models, schemas, routers, requirements, Dockerfile,
+    # load test) is rendered locally, the LLM only writes the remaining files
+    rendered, services = render_boilerplate(api_endpoints, db_schema, GENERATION_PROFILE)
+
+    # Files generated for a previous version of the document
+    previous = (state.get("previous_analysis") or {}).get("generation") or {}
+
+    # Phase 1: a small skeleton call that only returns the file manifest. It
+    # only depends on which files are rendered and which services they call.
+    manifest_key = input_hash(sorted(rendered), json.dumps(services, sort_keys=True))
+    if previous.get("manifest_key") == manifest_key and previous.get("manifest"):
+        manifest = previous["manifest"]
+    else:
+        manifest = generate_manifest(analysis, rendered, services)
+
+    # Phase 2: generate every file's content concurrently
+    contexts = {
+        entry["path"]: file_context(entry["path"], analysis, rendered, services, business_logic, auth_requirements)
+        for entry in manifest
+    }
+    files, file_cache, failed = generate_files(manifest, contexts, rendered, previous.get("files"))
+    if GENERATION_PROFILE == "async":
+        enforce_async_services(files, file_cache, services, contexts, api_endpoints, db_schema)
+        # Failed service modules were replaced by the rendered ones
+        failed = {path: error for path, error in failed.items() if path not in files}
+    files.update(rendered)
+
+    structure = build_structure_tree(files)
+    generation_cache = {
+        "manifest_key": manifest_key,
+        "manifest": manifest,
+        "files": file_cache,
+        "failed": failed,
+        # Rendered from templates, never sent to the LLM for fixes
+        "rendered": sorted(rendered),
+    }
+    return {"setup": json.dumps(structure), "generation_cache": generation_cache, **state}
+
+def file_context(path, analysis, rendered, services, business_logic, auth_requirements):
+    """
+    Context given to the LLM for one file
+
+    Service and test modules of a single resource only need that resource's
+    router, models and schemas, so a change elsewhere in the SRS does not
+    invalidate them. Every other file gets the whole analysis.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    for service_path in services:
+        resource = os.path.splitext(os.path.basename(service_path))[0]
+        if name not in (resource, f"test_{resource}"):
+            continue
+        related = [f"app/api/routes/{resource}.py"] + [
+            p for p in rendered
+            if p.startswith(("app/models/", "app/schemas/")) and resource.rstrip("s") in p
+        ]
+        sources = "\n".join(f"--- {p}\n{rendered[p]}" for p in related if p in rendered)
+        return f"""
+    RELATED FILES:
+    {sources}
+    BUSINESS LOGIC:
+    {business_logic}
+    AUTHENTICATION AND AUTHORIZATION:
+    {auth_requirements}
+    """
+    return analysis
+
+def generate_manifest(analysis, rendered=None, services=None):
+    """
+    Ask the LLM for the list of files of the project, without their content
+
+    Files already rendered from templates are excluded from the manifest, and
+    every service module the rendered routers call is always part of it.
+    """
+    rendered = rendered or {}
+    services = services or {}
+    existing = "\n".join(f"- {path}" for path in rendered)
+
     prompt = f"""
-    Based on the following project analysis, generate the complete initial FastAPI project structure in JSON format.
-    Just give structure in response, do not include any other information and give json only dont add any other text.
+    Based on the following project analysis, list every file of the initial FastAPI project.
+    Do not write the content of the files, only their path and a one line description of what the file contains.
+    Just give the manifest in response, do not include any other information and give json only dont add any other text.
     Dont create tables in database if they already exist in the database.
 
-    The JSON should include:
-    - Folder structure with nested directories and files
-    - File names as keys and their content as values
-    - Include a "requirements.txt" file with necessary dependencies
-    - Include a "setup.sh" script for setting up the environment
- 
+    The following files are already generated, do not list them:
+    {existing}
+
+    The manifest must include:
+    - The business logic modules under app/services/ called by the routers
+    - Test files under tests/ following Test-Driven Development (TDD) principles, using pytest
+
     Below is the format of response other than this you should not add any other text.
-    The response should be in JSON format.
     Example JSON format:
     {{
-        "app/": {{
-            "routers/": {{
-                "user.py": "content of user.py",
-                "item.py": "content of item.py"
-            }},
-            "models/": {{
-                "user.py": "content of user.py",
-                "item.py": "content of item.py"
-            }},
-            "__init__.py": "content of __init__.py",
-            "main.py": "content of main.py"
-        }},
-        "requirements.txt": "fastapi\\nuvicorn\\npsycopg2-binary\\nalembic\\nsqlalchemy\\npython-dotenv",
-        "setup.sh": "content of setup.sh"
+        "files": [
+            {{"path": "app/services/user.py", "description": "Business logic for users"}},
+            {{"path": "app/core/security.py", "description": "Password hashing and token handling"}},
+            {{"path": "tests/test_user.py", "description": "pytest tests for the user endpoints"}},
+            {{"path": "README.md", "description": "Project documentation"}}
+        ]
     }}
 
     Format of Folder should be like this:
@@ -59,28 +154,147 @@ def setup_node(state):
 │── requirements.txt
 │── .env
 │── README.md
+    {analysis}
+    """
+    res = llama3_chat(prompt, max_tokens=1024, node="project_manifest")
+    manifest = json.loads(validate_output("project_manifest", extract_json_from_text(res)))
 
-a.	Follow Test-Driven Development (TDD) principles.
-b.	Generate test cases 
-c.	Use pytest for running tests and validating test coverage.
-d.	Ensure tests cover all functional aspects, including edge cases.
+    entries = []
+    seen = set()
+    for entry in manifest["files"]:
+        path = entry["path"].strip().lstrip("/")
+        if not path or path.endswith("/") or path in seen:
+            continue
+        if path in rendered:
+            continue
+        seen.add(path)
+        entries.append({"path": path, "description": entry.get("description", "")})
 
-    API Definitions:
-    {api_endpoints}
-    BUSINESS LOGIC:
-    {business_logic}
-    AUTHENTICATION AND AUTHORIZATION:
-    {auth_requirements}
-    DATABASE SCHEMA:
-    {db_schema}
+    for path, signatures in services.items():
+        description = "Business logic module defining: " + "; ".join(signatures)
+        for entry in entries:
+            if entry["path"] == path:
+                entry["description"] = description
+                break
+        else:
+            entries.append({"path": path, "description": description})
+    return entries
 
+def generate_files(manifest, contexts, rendered=None, previous_files=None, max_workers=PROJECT_GEN_MAX_WORKERS):
     """
-    res = llama3_chat(prompt)
-    
-    # Clean up the response to extract the actual JSON
-    cleaned_json = extract_json_from_text(res)
-    
-    return {"setup": cleaned_json, **state}
+    Generate the content of every file in the manifest with bounded parallelism
+
+    Files whose context is unchanged since the previous version of the
+    document are reused instead of being generated again. A file whose
+    generation fails FILE_GENERATION_ATTEMPTS times is left out of the project.
+
+    Returns:
+        (files, cache, failed) where files maps file path to file content, in
+        manifest order, cache maps file path to {"hash", "content"} and failed
+        maps the path of every file that could not be generated to the error
+    """
+    previous_files = previous_files or {}
+    file_list = "\n".join(f"- {path}: already generated" for path in (rendered or {}))
+    file_list += "\n" + "\n".join(f"- {entry['path']}: {entry['description']}" for entry in manifest)
+    paths = sorted(list(rendered or {}) + [entry["path"] for entry in manifest])
+
+    def generate(entry):
+        key = input_hash(entry["path"], paths, contexts[entry["path"]])
+        cached = previous_files.get(entry["path"]) or {}
+        if cached.get("hash") == key and cached.get("content"):
+            return key, cached["content"]
+        for attempt in range(1, FILE_GENERATION_ATTEMPTS + 1):
+            try:
+                return key, generate_file_content(entry, file_list, contexts[entry["path"]])
+            except Exception as e:
+                print(f"❌ Failed to generate {entry['path']} (attempt {attempt}/{FILE_GENERATION_ATTEMPTS}): {str(e)}")
+                error = str(e)
+        return None, error
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(propagate(generate), manifest))
+
+    files = {}
+    cache = {}
+    failed = {}
+    for entry, (key, content) in zip(manifest, results):
+        if key is None:
+            failed[entry["path"]] = content
+            continue
+        files[entry["path"]] = content
+        cache[entry["path"]] = {"hash": key, "content": content}
+    return files, cache, failed
+
+def enforce_async_services(files, cache, services, contexts, api_endpoints, db_schema):
+    """
+    Make sure every service module follows the async profile
+
+    A module that does not is generated once more with the problems
+    listed, then replaced by the rendered async CRUD service.
+    """
+    fallbacks = None
+    for path, signatures in services.items():
+        problems = async_violations(files.get(path, ""), signatures)
+        if not problems:
+            continue
+        print(f"🔧 {path} does not follow the async profile: {'; '.join(problems[:5])}")
+        entry = {
+            "path": path,
+            "description": "Business logic module defining: " + "; ".join(signatures)
+            + ". Fix these problems of the previous attempt: " + "; ".join(problems),
+        }
+        try:
+            content = generate_file_content(entry, "", contexts.get(path, ""))
+        except Exception as e:
+            print(f"❌ Failed to regenerate {path}: {str(e)}")
+            content = ""
+        if async_violations(content, signatures):
+            fallbacks = fallbacks or render_services(api_endpoints, db_schema)
+            content = fallbacks[path]
+            print(f"🔧 Using the rendered async CRUD service for {path}")
+        files[path] = content
+        if path in cache:
+            cache[path] = {**cache[path], "content": content}
+
+def generate_file_content(entry, file_list, analysis):
+    """Generate the content of a single project file"""
+    prompt = f"""
+    You are writing one file of a FastAPI project generated from the project analysis below.
+    Write the complete content of the file "{entry['path']}" ({entry['description']}).
+    Give only the raw content of the file in response, do not include any other information, explanation or markdown.
+    Use imports that are consistent with the other files of the project.
+    Models live in app/models/<table>.py, Pydantic schemas in app/schemas/<table>.py and
+    the database session dependency is get_session in app/database.py.
+    {ASYNC_GUIDELINES if GENERATION_PROFILE == "async" else ""}
+    Follow Test-Driven Development (TDD) principles and use pytest for tests, covering edge cases.
+
+    Files of the project:
+    {file_list}
+    {analysis}
+    """
+    res = llama3_chat(prompt, max_tokens=PROJECT_GEN_FILE_MAX_TOKENS, node="project_file")
+    return strip_code_fences(res)
+
+def build_structure_tree(files):
+    """
+    Turn a {path: content} mapping into the nested structure expected by
+    generate_project_structure, where directory keys end with "/"
+    """
+    tree = {}
+    for path, content in files.items():
+        parts = path.split("/")
+        node = tree
+        for part in parts[:-1]:
+            node = node.setdefault(f"{part}/", {})
+        node[parts[-1]] = content
+    return tree
+
+def strip_code_fences(text):
+    """Remove a markdown code block wrapping the whole response, if any"""
+    match = re.match(r'^\s*```[\w.+-]*\s*\n([\s\S]*?)\n?```\s*$', text)
+    if match:
+        return match.group(1)
+    return text
 
 def extract_json_from_text(text):
     """Extract valid JSON from text that may contain markdown or other content"""
@@ -116,4 +330,4 @@ def extract_json_from_text(text):
             pass
     
     # If all else fails, just return the original text and let the caller handle errors
-    return text
\ No newline at end of file
+    return text
@@ -0,0 +1,250 @@
+from contextlib import contextmanager
+from graph_builder import build_langgraph
+from utils.db import create_tables_from_schema
+from utils.project_generator import generate_project_structure, setup_virtual_env
+from utils.documentation import generate_project_documentation
+from utils.output_schema import NodeOutputError
+from utils.incremental import document_key, load_analysis, save_analysis, section_fingerprints, diff_sections, same_document
+from utils.checkpoint import document_hash, run_id_for, pipeline_config, get_checkpointer, invoke_graph, run_stage, clear_run
+from utils.near_duplicate import document_signature, find_near_duplicate, index_document
+from utils.code_validator import check_project_runtime
+from utils.test_runner import run_project_tests
+from utils.seed_data import seed_tables
+from utils.config import NEAR_DUPLICATE_ENABLED, RUNTIME_CHECK_ENABLED, TEST_RUN_ENABLED, SEED_DATA_ENABLED
+from utils.profiling import span
+from utils.workspace import WorkspaceQuotaExceeded, create_workspace, use_workspace, seed_workspace, check_run_quota
+import json
+import os
+import time
+
+# The analysis pipeline shared by the FastAPI app (main.py) and the batch CLI (cli.py)
+
+@contextmanager
+def timed(timings, name):
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+def run_analysis(srs_text, srs_sections, filename, workspace_id=None):
+    """
+    Run the whole analysis pipeline on an SRS document in its own workspace
+
+    Args:
+        srs_text, srs_sections: Document text and section index from read_srs
+        filename: Name of the document, used to find its previous versions
+        workspace_id: Name of the workspace directory, defaults to the run id
+
+    Returns:
+        The JSON serializable analysis result
+    """
+    # Runs are checkpointed per document and configuration, a retry resumes the failed run
+    doc_hash = document_hash(srs_text)
+    run_id = run_id_for(doc_hash, pipeline_config())
+
+    try:
+        workspace = create_workspace(workspace_id or run_id)
+    except WorkspaceQuotaExceeded as e:
+        return {"status": "error", "message": str(e)}
+
+    with use_workspace(workspace):
+        return run_pipeline(srs_text, srs_sections, filename, doc_hash, run_id, workspace)
+
+def run_pipeline(srs_text, srs_sections, filename, doc_hash, run_id, workspace):
+    # Look up the analysis of the previous version of this document
+    doc_key = document_key(filename, srs_text)
+    fingerprints = section_fingerprints(srs_text, srs_sections)
+    previous = load_analysis(doc_key)
+    if previous is not None and not same_document(previous, fingerprints):
+        print(f"🔎 Stored analysis of {doc_key} shares no section with this document, analyzing from scratch")
+        previous = None
+
+    # Otherwise start from a lightly edited copy analyzed before, if any
+    signature = document_signature(srs_text, srs_sections) if NEAR_DUPLICATE_ENABLED else None
+    near_duplicate = None
+    if previous is None:
+        match = find_near_duplicate(signature, exclude=doc_key)
+        previous = load_analysis(match[0]) if match else None
+        if previous:
+            near_duplicate = {"document": match[0], "similarity": round(match[1], 3)}
+            print(f"🔗 {doc_key} is a near-duplicate of {match[0]} (similarity {match[1]:.2f})")
+
+    changes = diff_sections((previous or {}).get("fingerprints"), fingerprints)
+    if previous:
+        print(f"♻️ Previous analysis of {previous.get('doc_key', doc_key)} found, changed sections: {changes['changed'] + changes['added'] + changes['removed']}")
+        # Start from the project generated for the previous version
+        seed_workspace(workspace, previous.get("workspace"))
+
+    # Wall-clock seconds spent in each stage
+    timings = {}
+
+    # Step 1: Initialize graph
+    graph = build_langgraph(checkpointer=get_checkpointer())
+    # Step 2: Run the LangGraph
+    try:
+        with timed(timings, "graph"):
+            final_state, resumed = invoke_graph(graph, {
+                "srs_text": srs_text,
+                "srs_sections": srs_sections,
+                "previous_analysis": previous,
+            }, run_id)
+    except NodeOutputError as e:
+        # Fail fast, the checkpoint lets a retry resume at the failed node
+        return {
+            "status": "error",
+            "message": str(e),
+            "node_output": e.output_key,
+            "validation_errors": e.errors
+        }
+    save_analysis(doc_key, srs_text, srs_sections, final_state, workspace["id"])
+    index_document(doc_key, signature)
+    print("===========================================================")
+    print(final_state["setup"])
+     # Step 3: Parse db_schema
+    try:
+        db_schema_dict = json.loads(final_state["db_schema"])
+        
+        print("===========================================================")
+        print(final_state["setup"])
+        # Step 4: Create tables in PostgreSQL
+        with timed(timings, "create_tables"):
+            ddl_plan = run_stage(
+                run_id, doc_hash, "create_tables",
+                lambda: create_tables_from_schema(db_schema_dict, final_state["api_endpoints"]),
+            )
+
+        # Step 4b: Fill the tables with synthetic rows
+        seed_data = None
+        if SEED_DATA_ENABLED:
+            with timed(timings, "seed_data"):
+                seed_data = run_stage(run_id, doc_hash, "seed_data", lambda: seed_tables(ddl_plan))
+        
+        # Step 5: Generate project structure
+        project_dir = workspace["project_dir"]
+        print("===========================================================")
+        print(final_state["setup"])
+        with timed(timings, "generate_project"):
+            success, message = run_stage(
+                run_id, doc_hash, "generate_project",
+                lambda: generate_project_structure(final_state["setup"], project_dir),
+                is_complete=lambda result: result[0],
+            )
+        check_run_quota(workspace)
+        # project_setup may have been reused as a whole, its cache is the previous one then
+        generation = (
+            final_state.get("generation_cache")
+            or (final_state.get("previous_analysis") or {}).get("generation")
+            or {}
+        )
+        failed_files = generation.get("failed") or {}
+        rendered_files = set(generation.get("rendered") or [])
+        if failed_files:
+            print(f"❌ Files that could not be generated: {', '.join(failed_files)}")
+        
+        # Step 6: Set up virtual environment
+        if success:
+            with timed(timings, "setup_virtual_env"):
+                env_success, env_message = run_stage(
+                    run_id, doc_hash, "setup_virtual_env",
+                    lambda: setup_virtual_env(project_dir),
+                    is_complete=lambda result: result[0],
+                )
+            check_run_quota(workspace)
+        else:
+            env_success = False
+            env_message = "Skipped due to project generation failure"
+
+        # Step 6b: Import every generated module in the project's venv
+        runtime_check = None
+        if env_success and RUNTIME_CHECK_ENABLED:
+            with timed(timings, "runtime_check"):
+                runtime_check = run_stage(
+                    run_id, doc_hash, "runtime_check",
+                    lambda: check_project_runtime(project_dir, workspace["venv_dir"], rendered=rendered_files),
+                )
+
+        # Step 6c: Run the generated tests
+        tests = None
+        if env_success and TEST_RUN_ENABLED:
+            with timed(timings, "tests"):
+                tests = run_stage(
+                    run_id, doc_hash, "tests",
+                    lambda: run_project_tests(project_dir, workspace["venv_dir"]),
+                )
+
+         # Step 7: Generate documentation
+        with timed(timings, "documentation"):
+            doc_files = run_stage(
+                run_id, doc_hash, "documentation",
+                lambda: generate_project_documentation(final_state, workspace["docs_dir"]),
+            )
+
+        # Keep the checkpoints of incomplete runs so a retry resumes at the failed stage
+        if success and env_success and not failed_files:
+            clear_run(run_id)
+
+        return {
+            "status": "success",
+            "run": {
+                "id": run_id,
+                "resumed": resumed,
+                "timings": timings
+            },
+            "workspace": {
+                "id": workspace["id"],
+                "project_dir": workspace["project_dir"],
+                "venv_dir": workspace["venv_dir"],
+                "docs_dir": workspace["docs_dir"]
+            },
+            "incremental": {
+                "document": doc_key,
+                "previous_version_found": previous is not None and near_duplicate is None,
+                "near_duplicate_of": near_duplicate,
+                "sections": changes,
+                "reused_nodes": [
+                    name for name, key in final_state.get("node_inputs", {}).items()
+                    if (previous or {}).get("node_inputs", {}).get(name) == key
+                ],
+            },
+            "api_endpoints": json.loads(final_state["api_endpoints"]),
+            "business_logic": final_state["business_logic"],
+            "auth_requirements": final_state["auth_requirements"],
+            "db_schema": db_schema_dict,
+            "ddl_plan": ddl_plan,
+            "seed_data": seed_data,
+            "project_generation": {
+                # Files the LLM failed to write are left out of the project
+                "success": success and not failed_files,
+                "message": message if not failed_files else f"{message}, {len(failed_files)} files failed to generate",
+                "failed_files": failed_files,
+                "virtual_env": {
+                    "success": env_success,
+                    "message": env_message
+                },
+                "runtime_check": runtime_check,
+                "tests": tests
+            },
+             "documentation": {
+                "readme": f"/workspaces/{workspace['id']}/docs/{os.path.basename(doc_files['readme'])}",
+                "api_documentation": f"/workspaces/{workspace['id']}/docs/{os.path.basename(doc_files['api_doc'])}",
+                "workflow_diagram": f"/workspaces/{workspace['id']}/docs/{os.path.basename(doc_files['workflow_diagram'])}",
+                "workflow_graph": f"/workspaces/{workspace['id']}/docs/{os.path.basename(doc_files['workflow_graph'])}"
+            }
+        }
+    except json.JSONDecodeError as e:
+        # The graph's output cannot be used, a retry must run the graph again
+        clear_run(run_id)
+        return {
+            "status": "error", 
+            "message": f"Failed to parse JSON: {str(e)}",
+            "raw_db_schema": final_state["db_schema"]
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Failed to process: {str(e)}",
+            "db_schema": final_state.get("db_schema", "Not available")
+        }
+
@@ -0,0 +1,138 @@
+import asyncio
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from utils import metrics
+from utils.config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_MAX_PER_CLIENT,
+    ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+metrics.describe("admission_in_flight", "Analyses currently running in this worker")
+metrics.describe("admission_queue_depth", "Analyses waiting for a slot in this worker")
+metrics.describe("admission_admitted_total", "Analyses admitted")
+metrics.describe("admission_rejected_total", "Analyses rejected, by reason")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after=ADMISSION_RETRY_AFTER_SECONDS):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Server busy ({reason}), retry in {retry_after} seconds")
+
+
+class AdmissionController:
+    """
+    Limit the analyses running at once in a worker
+
+    Requests beyond max_in_flight wait in a bounded queue for at most
+    queue_timeout seconds. Freed slots go to the queued client with the
+    fewest running analyses, round robin among equals, so one client
+    uploading a burst cannot starve the others. A client may not have more
+    than max_per_client analyses running or queued.
+
+    Must be used from the event loop thread only.
+    """
+
+    def __init__(self, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS, max_per_client=ADMISSION_MAX_PER_CLIENT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_client = max_per_client
+        self._in_flight = 0
+        self._queued = 0
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(int)
+        # client id -> queue of futures resolved when the client gets a slot
+        self._waiters = OrderedDict()
+
+    @asynccontextmanager
+    async def admit(self, client_id):
+        await self._acquire(client_id)
+        try:
+            yield
+        finally:
+            self._release(client_id)
+
+    async def _acquire(self, client_id):
+        if self._running.get(client_id, 0) + self._waiting.get(client_id, 0) >= self.max_per_client:
+            self._reject("client_quota")
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._start(client_id)
+            return
+        if self._queued >= self.max_queue:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client_id, deque()).append(future)
+        self._waiting[client_id] += 1
+        self._queued += 1
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled right after being given a slot, hand it back
+            if future.done() and not future.cancelled():
+                self._release(client_id)
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+                self._remove_waiter(client_id, future)
+
+        if future.cancelled():
+            self._reject("queue_timeout")
+
+    def _start(self, client_id):
+        self._in_flight += 1
+        self._running[client_id] += 1
+        metrics.inc("admission_admitted_total")
+        self._update_gauges()
+
+    def _release(self, client_id):
+        self._in_flight -= 1
+        self._running[client_id] -= 1
+        if not self._running[client_id]:
+            del self._running[client_id]
+        self._dispatch()
+        self._update_gauges()
+
+    def _dispatch(self):
+        """Hand free slots to the queued clients with the fewest running analyses"""
+        while self._in_flight < self.max_in_flight and self._waiters:
+            client_id = min(self._waiters, key=lambda c: self._running.get(c, 0))
+            future = self._waiters[client_id].popleft()
+            self._waiting[client_id] -= 1
+            self._queued -= 1
+            # Round robin among clients with as many running analyses
+            if self._waiters[client_id]:
+                self._waiters.move_to_end(client_id)
+            else:
+                del self._waiters[client_id]
+                del self._waiting[client_id]
+            self._start(client_id)
+            future.set_result(True)
+
+    def _remove_waiter(self, client_id, future):
+        waiters = self._waiters.get(client_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._waiting[client_id] -= 1
+            self._queued -= 1
+            if not waiters:
+                del self._waiters[client_id]
+                del self._waiting[client_id]
+        self._update_gauges()
+
+    def _reject(self, reason):
+        metrics.inc("admission_rejected_total", reason=reason)
+        raise AdmissionRejected(reason)
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission_in_flight", self._in_flight)
+        metrics.set_gauge("admission_queue_depth", self._queued)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from sqlalchemy import create_engine, text
+from utils.config import (
+    CHECKPOINT_BACKEND,
+    CHECKPOINT_DB_PATH,
+    GENERATION_PROFILE,
+    SECTION_ROUTING_ENABLED,
+    SECTION_ROUTING_MIN_RECALL,
+    INCREMENTAL_ANALYSIS_ENABLED,
+    NEAR_DUPLICATE_ENABLED,
+    NEAR_DUPLICATE_THRESHOLD,
+    SEED_MAX_CHANGED_SHARE,
+    RUNTIME_CHECK_ENABLED,
+    TEST_RUN_ENABLED,
+    SEED_DATA_ENABLED,
+    SEED_ROWS_PER_TABLE,
+    SEED_ROWS_OVERRIDES,
+)
+from utils.db import get_engine, get_database_url
+from utils.groq_llm import LLM_MODEL
+
+# Graph nodes are checkpointed by LangGraph, keyed by thread id = run id. The
+# stages that run after the graph (DDL, project generation, virtual env,
+# documentation) are recorded in the pipeline_stages table of the same
+# database, so a retry resumes from the first incomplete one. A failing stage
+# invalidates itself and the stages after it, and the checkpoints of a run
+# are cleared once it fully succeeded.
+
+_lock = threading.Lock()
+_checkpointer = None
+_stage_engine = None
+
+# Bump when the pipeline changes in a way that invalidates stored runs
+PIPELINE_VERSION = "1"
+
+# Post-graph stages in the order the pipeline runs them
+PIPELINE_STAGES = [
+    "create_tables", "seed_data", "generate_project", "setup_virtual_env", "runtime_check", "tests", "documentation",
+]
+
+
+def document_hash(srs_text):
+    return hashlib.sha256(srs_text.encode("utf-8")).hexdigest()
+
+
+def run_id_for(doc_hash, config):
+    """
+    Run id of a document analysed with a given pipeline configuration
+
+    Args:
+        doc_hash: document_hash of the SRS text
+        config: Settings the outputs depend on, usually pipeline_config()
+    """
+    config = json.dumps({"pipeline": PIPELINE_VERSION, **config}, sort_keys=True)
+    return hashlib.sha256(f"{doc_hash}:{config}".encode("utf-8")).hexdigest()[:24]
+
+
+def pipeline_config():
+    """The settings of this process that change the result of an analysis"""
+    return {
+        "model": LLM_MODEL,
+        "generation_profile": GENERATION_PROFILE,
+        "section_routing": [SECTION_ROUTING_ENABLED, SECTION_ROUTING_MIN_RECALL],
+        "incremental": [INCREMENTAL_ANALYSIS_ENABLED, SEED_MAX_CHANGED_SHARE],
+        "near_duplicate": [NEAR_DUPLICATE_ENABLED, NEAR_DUPLICATE_THRESHOLD],
+        "runtime_check": RUNTIME_CHECK_ENABLED,
+        "tests": TEST_RUN_ENABLED,
+        "seed_data": [SEED_DATA_ENABLED, SEED_ROWS_PER_TABLE, SEED_ROWS_OVERRIDES],
+    }
+
+
+def get_checkpointer():
+    """Return the shared LangGraph checkpointer, or None if checkpointing is disabled"""
+    global _checkpointer
+    if CHECKPOINT_BACKEND == "none":
+        return None
+    with _lock:
+        if _checkpointer is None:
+            if CHECKPOINT_BACKEND == "postgres":
+                from psycopg import connect
+                from psycopg.rows import dict_row
+                from langgraph.checkpoint.postgres import PostgresSaver
+
+                conn = connect(get_database_url(), autocommit=True, prepare_threshold=0, row_factory=dict_row)
+                _checkpointer = PostgresSaver(conn)
+            else:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+
+                conn = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False)
+                _checkpointer = SqliteSaver(conn)
+            _checkpointer.setup()
+        return _checkpointer
+
+
+def graph_config(run_id):
+    return {"configurable": {"thread_id": run_id}}
+
+
+def invoke_graph(graph, initial_state, run_id):
+    """
+    Run the graph, resuming a previous attempt of the same run if there is one
+
+    Returns:
+        (final_state, resumed) where resumed tells whether checkpointed node
+        outputs were reused
+    """
+    if get_checkpointer() is None:
+        return graph.invoke(initial_state), False
+
+    config = graph_config(run_id)
+    snapshot = graph.get_state(config)
+    if snapshot.values and snapshot.next:
+        print(f"♻️ Resuming run {run_id} at {', '.join(snapshot.next)}")
+        return graph.invoke(None, config), True
+    if snapshot.values:
+        print(f"♻️ Graph of run {run_id} already completed")
+        return snapshot.values, True
+    return graph.invoke(initial_state, config), False
+
+
+def _get_stage_engine():
+    global _stage_engine
+    with _lock:
+        if _stage_engine is None:
+            if CHECKPOINT_BACKEND == "postgres":
+                _stage_engine = get_engine()
+            else:
+                _stage_engine = create_engine(f"sqlite:///{CHECKPOINT_DB_PATH}")
+            with _stage_engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS pipeline_stages ("
+                    " run_id VARCHAR(64) NOT NULL,"
+                    " doc_hash VARCHAR(64) NOT NULL,"
+                    " stage VARCHAR(64) NOT NULL,"
+                    " result TEXT,"
+                    " completed_at FLOAT,"
+                    " PRIMARY KEY (run_id, stage))"
+                ))
+        return _stage_engine
+
+
+def run_stage(run_id, doc_hash, stage, fn, is_complete=None):
+    """
+    Run a post-graph stage once per run
+
+    If the stage already completed for this run, its recorded result is
+    returned without running it again. A result is only recorded when
+    is_complete(result) is true. When the stage raises or is incomplete, the
+    results of the stages after it are forgotten too, as they may depend on
+    it, so a retry runs them all again.
+
+    Results must be JSON serializable.
+    """
+    if CHECKPOINT_BACKEND == "none":
+        return fn()
+
+    engine = _get_stage_engine()
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT result FROM pipeline_stages WHERE run_id = :run_id AND stage = :stage"),
+            {"run_id": run_id, "stage": stage},
+        ).fetchone()
+    if row is not None:
+        print(f"♻️ Stage {stage} of run {run_id} already completed")
+        return json.loads(row[0])
+
+    try:
+        result = fn()
+    except Exception:
+        invalidate_stages(run_id, stage)
+        raise
+    if is_complete is not None and not is_complete(result):
+        invalidate_stages(run_id, stage)
+    else:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO pipeline_stages (run_id, doc_hash, stage, result, completed_at)"
+                    " VALUES (:run_id, :doc_hash, :stage, :result, :completed_at)"
+                ),
+                {
+                    "run_id": run_id,
+                    "doc_hash": doc_hash,
+                    "stage": stage,
+                    "result": json.dumps(result),
+                    "completed_at": time.time(),
+                },
+            )
+    return result
+
+
+def invalidate_stages(run_id, stage):
+    """Forget the results of a stage and of every stage after it"""
+    later = PIPELINE_STAGES[PIPELINE_STAGES.index(stage):] if stage in PIPELINE_STAGES else [stage]
+    with _get_stage_engine().begin() as conn:
+        for name in later:
+            conn.execute(
+                text("DELETE FROM pipeline_stages WHERE run_id = :run_id AND stage = :stage"),
+                {"run_id": run_id, "stage": name},
+            )
+
+
+def clear_run(run_id):
+    """Forget the checkpoints of a run, once it succeeded or its graph outputs are unusable"""
+    checkpointer = get_checkpointer()
+    if checkpointer is None:
+        return
+    if hasattr(checkpointer, "delete_thread"):
+        checkpointer.delete_thread(run_id)
+    with _get_stage_engine().begin() as conn:
+        conn.execute(text("DELETE FROM pipeline_stages WHERE run_id = :run_id"), {"run_id": run_id})
@@ -3,8 +3,14 @@ import json
 import re
 import ast
 import subprocess
+import sys
 import tempfile
 from utils.groq_llm import llama3_chat
+from utils.sandbox import SandboxPool, venv_python
+from utils.config import RUNTIME_FIX_MAX_ITERATIONS
+
+# Directories whose modules are only compiled, importing them has side effects
+COMPILE_ONLY_DIRS = {"alembic", "migrations", "scripts", "loadtest"}
 
 def validate_python_syntax(code):
     """Check if Python code has valid syntax"""
@@ -14,52 +20,6 @@ def validate_python_syntax(code):
     except SyntaxError as e:
         return False, str(e)
 
-def validate_import_dependencies(code, project_dir):
-    """Check if imports in the code are available"""
-    # Extract imports from the code
-    imports = []
-    try:
-        tree = ast.parse(code)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    imports.append(name.name)
-            elif isinstance(node, ast.ImportFrom):
-                imports.append(node.module)
-    except SyntaxError:
-        # If there's a syntax error, we'll catch it in validate_python_syntax
-        return True, None
-        
-    # Check if each import is a standard library or exists in the project
-    missing_imports = []
-    for imp in imports:
-        if imp is None:
-            continue
-            
-        # Skip standard library modules
-        if imp in ['os', 'sys', 'json', 're', 'datetime', 'time', 'typing', 'collections',
-                  'pathlib', 'unittest', 'pytest', 'abc', 'math', 'random']:
-            continue
-            
-        # Check if it's a relative import within the project
-        if imp.startswith('.'):
-            continue
-            
-        # Split the import to handle cases like 'app.models'
-        base_module = imp.split('.')[0]
-        
-        # Check if it's a project module
-        if os.path.exists(os.path.join(project_dir, base_module)):
-            continue
-            
-        # If we get here, it's not found
-        missing_imports.append(imp)
-    
-    if missing_imports:
-        return False, f"Missing imports: {', '.join(missing_imports)}"
-    
-    return True, None
-
 def run_code_test(code, filename=None):
     """Try to execute the code to check for runtime errors"""
     if not filename:
@@ -89,7 +49,17 @@ def run_code_test(code, filename=None):
             os.unlink(filename)
 
 def fix_code(code, error_msg, context=None):
-    fixed_code = llama3_chat(prompt)
+    prompt = f"""The following Python code fails with this error:
+    {error_msg}
+
+    {context or ""}
+
+    Fix the error and return the complete corrected file. Only return the code, do not include any explanations.
+
+    Code:
+    {code}
+    """
+    fixed_code = llama3_chat(prompt, node="code_validator")
     
     # Extract code from the response if it's wrapped in markdown code blocks
     code_pattern = r'```(?:python)?\s*([\s\S]*?)\s*```'
@@ -99,105 +69,91 @@ def fix_code(code, error_msg, context=None):
     
     return fixed_code
 
-def refine_code_iteratively(code, file_path, project_dir, max_iterations=3):
-    iterations = 0
-    current_code = code
-    is_valid = False
-    error = None
-    
-    while iterations < max_iterations and not is_valid:
-        # Increment iteration counter
-        iterations += 1
-        
-        # Check syntax
-        syntax_valid, syntax_error = validate_python_syntax(current_code)
-        if not syntax_valid:
-            error = f"Syntax error: {syntax_error}"
-            print(f"Iteration {iterations}: Fixing syntax error in {file_path}")
-            current_code = fix_code(current_code, syntax_error, f"This code is for file: {file_path}")
-            continue
-        
-        # Check imports
-        imports_valid, imports_error = validate_import_dependencies(current_code, project_dir)
-        if not imports_valid:
-            error = f"Import error: {imports_error}"
-            print(f"Iteration {iterations}: Fixing import error in {file_path}")
-            
-            # Provide more context for import fixes
-            context = f"""
-            This code is for file: {file_path}
-            Project structure: The code is part of a FastAPI project with:
-            - app/ directory containing API routes, models, and services
-            - utils/ directory containing utility functions
-            - tests/ directory containing test files
-            
-            Fix the imports to use the correct relative or absolute imports.
-            """
-            
-            current_code = fix_code(current_code, imports_error, context)
-            continue
-        
-        # Run basic execution test if the file is a standalone script
-        if not file_path.endswith('__init__.py') and ('def ' in current_code or 'class ' in current_code):
-            # Skip execution test for now, as it would require complex mocking
-            pass
-        
-        # If we get here, the code is valid
-        is_valid = True
-    
-    return current_code, is_valid, iterations, error
+def project_modules(project_dir):
+    """
+    List the Python files of a generated project as sandbox check items
 
-def validate_and_refine_project(project_dir):
+    Files in packages become {"module": dotted name} and are imported, the
+    rest become {"path": relative path} and are only compiled.
+    """
+    items = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if d not in ("venv", "__pycache__") and not d.startswith("."))
+        for file in sorted(files):
+            if not file.endswith('.py'):
+                continue
+            relative_path = os.path.relpath(os.path.join(root, file), project_dir)
+            parts = relative_path[:-3].split(os.sep)
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            if parts and all(part.isidentifier() for part in parts) and parts[0] not in COMPILE_ONLY_DIRS:
+                items.append({"module": ".".join(parts), "file": relative_path})
+            else:
+                items.append({"path": relative_path, "file": relative_path})
+    return items
 
+def check_project_runtime(project_dir, venv_dir, max_iterations=RUNTIME_FIX_MAX_ITERATIONS, rendered=()):
+    """
+    Import every module of the generated project in its virtual environment
+    and fix the files that fail to import
+
+    Only the file an error was raised in is sent for fixing, modules that
+    fail because they import a broken module are fixed along with it. Files
+    in rendered come from the templates and are never sent, their errors
+    are only reported.
+
+    Returns:
+        Stats with the modules checked, fixed and still failing
+    """
+    items = project_modules(project_dir)
     stats = {
-        "total_files": 0,
-        "valid_files": 0,
-        "fixed_files": 0,
-        "failed_files": 0,
+        "checked_modules": len(items),
+        "failed_modules": 0,
+        "fixed_files": [],
         "iterations": 0,
         "errors": []
     }
-    
-    for root, _, files in os.walk(project_dir):
-        for file in files:
-            if file.endswith('.py'):
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, project_dir)
-                
-                stats["total_files"] += 1
-                
-                # Read the current code
+    python = venv_python(venv_dir)
+    if not items or not os.path.exists(python):
+        return stats
+
+    attempted = set()
+    with SandboxPool(project_dir, python) as pool:
+        results = pool.check([{k: v for k, v in item.items() if k != "file"} for item in items])
+        files = {item.get("module") or item["path"]: item["file"] for item in items}
+
+        for iteration in range(max_iterations):
+            failing = {key: result for key, result in results.items() if result}
+            # Fix each file an error originated in once per iteration
+            origins = {}
+            for key, result in failing.items():
+                if result.get("origin") in files.values() and result["origin"] not in rendered:
+                    origins.setdefault(result["origin"], result["error"])
+            if not origins:
+                break
+
+            stats["iterations"] += 1
+            for relative_path, error in origins.items():
+                print(f"Iteration {iteration + 1}: Fixing runtime error in {relative_path}")
+                file_path = os.path.join(project_dir, relative_path)
                 with open(file_path, 'r') as f:
                     code = f.read()
-                
-                # Check if code is already valid
-                syntax_valid, _ = validate_python_syntax(code)
-                imports_valid, _ = validate_import_dependencies(code, project_dir)
-                
-                if syntax_valid and imports_valid:
-                    stats["valid_files"] += 1
-                    continue
-                
-                # If not valid, refine it
-                print(f"Refining code in {relative_path}...")
-                refined_code, is_valid, iterations, error = refine_code_iteratively(
-                    code, relative_path, project_dir
-                )
-                
-                stats["iterations"] += iterations
-                
-                if is_valid:
-                    # Write the refined code back to the file
+                fixed = fix_code(code, error, f"This code is for file: {relative_path} of a FastAPI project, it fails when imported")
+                if validate_python_syntax(fixed)[0]:
                     with open(file_path, 'w') as f:
-                        f.write(refined_code)
-                    stats["fixed_files"] += 1
-                    print(f"✅ Successfully refined {relative_path} in {iterations} iterations")
-                else:
-                    stats["failed_files"] += 1
-                    stats["errors"].append({
-                        "file": relative_path,
-                        "error": error
-                    })
-                    print(f"❌ Failed to refine {relative_path}: {error}")
-    
-    return stats
\ No newline at end of file
+                        f.write(fixed)
+
+            retry = [{k: v for k, v in item.items() if k != "file"} for item in items if results.get(item.get("module") or item["path"])]
+            results.update(pool.check(retry))
+            attempted.update(origins)
+
+    still_failing = {result.get("origin") for result in results.values() if result}
+    stats["fixed_files"] = sorted(attempted - still_failing)
+    for key, result in results.items():
+        if result:
+            stats["failed_modules"] += 1
+            stats["errors"].append({"module": key, "file": files[key], "error": result["error"]})
+            print(f"❌ {files[key]} fails to import: {result['error'].splitlines()[-1] if result['error'] else ''}")
+    if not stats["errors"]:
+        print(f"✅ All {len(items)} modules import cleanly")
+    return stats
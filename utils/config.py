@@ -2,4 +2,108 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
\ No newline at end of file
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Project generation
+PROJECT_GEN_MAX_WORKERS = int(os.getenv("PROJECT_GEN_MAX_WORKERS", "6"))
+PROJECT_GEN_FILE_MAX_TOKENS = int(os.getenv("PROJECT_GEN_FILE_MAX_TOKENS", "2048"))
+# "async" (async SQLAlchemy engine, sessions and routes) or "sync"
+GENERATION_PROFILE = os.getenv("GENERATION_PROFILE", "async").lower()
+
+# Uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+# SRS section routing
+SECTION_ROUTING_ENABLED = os.getenv("SECTION_ROUTING_ENABLED", "true").lower() == "true"
+# Share of a topic's keyword hits the routed sections must cover, else more sections are added
+SECTION_ROUTING_MIN_RECALL = float(os.getenv("SECTION_ROUTING_MIN_RECALL", "0.8"))
+
+# Incremental re-analysis
+ANALYSIS_STORE_DIR = os.getenv("ANALYSIS_STORE_DIR", os.path.join(os.getcwd(), ".srs_analyses"))
+INCREMENTAL_ANALYSIS_ENABLED = os.getenv("INCREMENTAL_ANALYSIS_ENABLED", "true").lower() == "true"
+
+# Near-duplicate documents: a new document whose estimated Jaccard similarity
+# to an analyzed one reaches the threshold starts from that analysis
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# A previous output is sent to the LLM as a seed, with only the changed
+# sections, while at most this share of the node's sections changed
+SEED_MAX_CHANGED_SHARE = float(os.getenv("SEED_MAX_CHANGED_SHARE", "0.5"))
+
+# Checkpointed pipeline runs: "sqlite", "postgres" or "none"
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(os.getcwd(), "checkpoints.sqlite"))
+
+# Coalescing of concurrent identical analyses, the directory must be shared by all workers
+SINGLE_FLIGHT_DIR = os.getenv("SINGLE_FLIGHT_DIR", os.path.join(os.getcwd(), ".single_flight"))
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "300"))
+
+# Per-run workspaces holding the generated project, its venv and the docs
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", os.path.join(os.getcwd(), "workspaces"))
+WORKSPACE_RUN_QUOTA_BYTES = int(os.getenv("WORKSPACE_RUN_QUOTA_BYTES", str(2 * 1024 ** 3)))
+WORKSPACE_TOTAL_QUOTA_BYTES = int(os.getenv("WORKSPACE_TOTAL_QUOTA_BYTES", str(20 * 1024 ** 3)))
+WORKSPACE_MAX_AGE_SECONDS = int(os.getenv("WORKSPACE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+WORKSPACE_GC_INTERVAL_SECONDS = int(os.getenv("WORKSPACE_GC_INTERVAL_SECONDS", "600"))
+# Virtual environments shared by the projects with the same requirements.txt
+VENV_CACHE_DIR = os.getenv("VENV_CACHE_DIR", os.path.join(os.getcwd(), ".venv_cache"))
+VENV_CACHE_MAX_AGE_SECONDS = int(os.getenv("VENV_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+# The shared environments are not part of any workspace, they have their own quota
+VENV_CACHE_MAX_BYTES = int(os.getenv("VENV_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+
+# Hedged LLM requests
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# A duplicate request is sent once a call is slower than this percentile of the node's recent calls
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_HISTORY = int(os.getenv("LLM_HEDGE_HISTORY", "200"))
+# Largest share of recent calls that may be hedged
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+
+# Seconds an LLM request may wait for its answer, also bounds how long the
+# abandoned request of a hedged call keeps running
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))
+
+# Most LLM requests per minute, 0 for no limit
+LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "0"))
+
+# Targeted repair of node outputs that fail their JSON Schema
+JSON_REPAIR_MAX_ATTEMPTS = int(os.getenv("JSON_REPAIR_MAX_ATTEMPTS", "2"))
+
+# Admission control for /analyze-srs, per worker
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "8"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "60"))
+# Most analyses a single client may have running or queued at once
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "30"))
+
+# Runtime checks of the generated project: modules are imported in its venv
+# by a pool of sandbox workers after the virtual environment is set up
+RUNTIME_CHECK_ENABLED = os.getenv("RUNTIME_CHECK_ENABLED", "true").lower() == "true"
+RUNTIME_FIX_MAX_ITERATIONS = int(os.getenv("RUNTIME_FIX_MAX_ITERATIONS", "2"))
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Workers are replaced after this many batches
+SANDBOX_MAX_JOBS_PER_WORKER = int(os.getenv("SANDBOX_MAX_JOBS_PER_WORKER", "50"))
+SANDBOX_BATCH_SIZE = int(os.getenv("SANDBOX_BATCH_SIZE", "8"))
+SANDBOX_MODULE_TIMEOUT_SECONDS = int(os.getenv("SANDBOX_MODULE_TIMEOUT_SECONDS", "10"))
+SANDBOX_MEMORY_LIMIT_BYTES = int(os.getenv("SANDBOX_MEMORY_LIMIT_BYTES", str(1024 ** 3)))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "60"))
+
+# Running the generated test suite after setup, one pytest process per test file
+TEST_RUN_ENABLED = os.getenv("TEST_RUN_ENABLED", "false").lower() == "true"
+TEST_WORKERS = int(os.getenv("TEST_WORKERS", str(os.cpu_count() or 1)))
+TEST_FILE_TIMEOUT_SECONDS = int(os.getenv("TEST_FILE_TIMEOUT_SECONDS", "120"))
+TEST_CACHE_DIR = os.getenv("TEST_CACHE_DIR", os.path.join(os.getcwd(), ".test_cache"))
+
+# Synthetic seed data loaded with COPY after the tables are created
+SEED_DATA_ENABLED = os.getenv("SEED_DATA_ENABLED", "false").lower() == "true"
+SEED_ROWS_PER_TABLE = int(os.getenv("SEED_ROWS_PER_TABLE", "1000"))
+# Per-table row counts, e.g. "users=100000,orders=1000000"
+SEED_ROWS_OVERRIDES = os.getenv("SEED_ROWS_OVERRIDES", "")
+# Rows generated and sent per COPY, bounds the memory used
+SEED_BATCH_ROWS = int(os.getenv("SEED_BATCH_ROWS", "50000"))
+
+# On-demand profiling of /analyze-srs (?profile=true or X-Profile: true),
+# only for requests with X-Admin-Token set to this token. Empty disables it.
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILING_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_SECONDS", "0.01"))
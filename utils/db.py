@@ -1,8 +1,16 @@
 # utils/db.py
 import os
 import json
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, ForeignKey
+from sqlalchemy import (
+    create_engine, inspect, MetaData, Table, Column, Index, ForeignKey,
+    Integer, BigInteger, SmallInteger, Float, Numeric, Boolean, Date, DateTime, Time, Text, String,
+)
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.schema import CreateTable, CreateIndex
+from utils.templates import (
+    parse_tables, parse_endpoints, path_parameters, identifier, match_table, model_column_spec, resolve_foreign_key,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,72 +18,178 @@ load_dotenv()
 Base = declarative_base()
 metadata = MetaData()
 
-def get_engine():
+def get_database_url():
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
     host = os.getenv("DB_HOST")
     port = os.getenv("DB_PORT")
     db = os.getenv("DB_NAME")
 
-    url = f"postgresql://{user}:{password}@{host}:{port}/{db}"
-    return create_engine(url)
-def create_tables_from_schema(schema_json):
+    return f"postgresql://{user}:{password}@{host}:{port}/{db}"
+
+def get_engine():
+    return create_engine(get_database_url())
+
+def column_type(spec):
+    """SQLAlchemy type of a column spec from templates.column_spec"""
+    kind = spec["kind"]
+    if kind == "string":
+        return String(spec.get("length", 255))
+    if kind == "numeric":
+        return Numeric(spec["precision"], spec["scale"])
+    if kind == "datetime":
+        return DateTime(timezone=spec.get("timezone", True))
+    if kind == "uuid":
+        return UUID(as_uuid=True)
+    return {
+        "integer": Integer,
+        "biginteger": BigInteger,
+        "smallinteger": SmallInteger,
+        "float": Float,
+        "boolean": Boolean,
+        "date": Date,
+        "time": Time,
+        "text": Text,
+        "json": JSONB,
+    }[kind]()
+
+
+def endpoint_lookups(api_endpoints, tables):
+    """
+    Columns filtered on by the API: path and query parameters of every
+    endpoint matched to the columns of the tables named in its path
+
+    Returns:
+        List of (table name, column name, reason)
+    """
+    lookups = []
+    for endpoint in parse_endpoints(api_endpoints) if api_endpoints else []:
+        resources = [
+            identifier(segment) for segment in endpoint["path"].strip("/").split("/")
+            if segment and not segment.startswith("{")
+        ]
+        matched = [table for table in (match_table(resource, tables) for resource in resources) if table]
+        params = [("path", p) for p in path_parameters(endpoint["path"])]
+        params += [("query", p) for p in endpoint["parameters"] if p not in path_parameters(endpoint["path"])]
+        for kind, param in params:
+            column = identifier(param)
+            for table in matched:
+                if column in {identifier(col["name"]) for col in table["columns"]}:
+                    lookups.append((table["name"], column, f"{kind} parameter of {endpoint['method']} {endpoint['path']}"))
+    return lookups
+
+
+def create_tables_from_schema(schema_json, api_endpoints=None):
+    """
+    Create the tables of the extracted schema, with inferred column types and indexes
+
+    Indexes are derived from foreign key columns, unique constraints and the
+    path and query parameters of the extracted API endpoints.
+
+    Tables that already exist are left as they are, along with their indexes.
+
+    Returns:
+        The DDL plan: tables with their column types, indexes with the
+        reason for each, whether each table and index was created, and the
+        DDL statements that were run
+    """
     engine = get_engine()
-    metadata.bind = engine
-    tables = {}
-    
-    # Track columns that we already defined
-    # Instead of tracking column names, track column dictionaries
-    defined_columns = {}
-    for table in schema_json.get("tables", []):
-        table_name = table["name"]
-        defined_columns[table_name] = set()
-        for column in table["columns"]:
-            # Extract column name from the column dict
-            if isinstance(column, dict):
-                defined_columns[table_name].add(column["name"])
-            else:
-                defined_columns[table_name].add(column)
-    
-    # Step 1: Create tables with all columns including FKs
-    for table in schema_json.get("tables", []):
+    # A fresh MetaData per call, the same table names come back on every run
+    metadata = MetaData()
+    tables = parse_tables(schema_json)
+    plan = {"tables": [], "indexes": [], "warnings": []}
+
+    indexed = set()
+    # Leading columns of existing indexes, which already serve lookups by that column
+    covered = set()
+    def add_index(table, columns, reason, unique=False):
+        key = (table.name, tuple(columns))
+        if key in indexed or (not unique and len(columns) == 1 and (table.name, columns[0]) in covered):
+            return
+        indexed.add(key)
+        covered.add((table.name, columns[0]))
+        name = f"{'uq' if unique else 'ix'}_{table.name}_{'_'.join(columns)}"[:63]
+        Index(name, *[table.c[column] for column in columns], unique=unique)
+        plan["indexes"].append({"name": name, "table": table.name, "columns": list(columns), "unique": unique, "reason": reason})
+
+    sa_tables = {}
+    for table in tables:
         name = table["name"]
         columns = []
-        
+        plan_columns = []
+        seen = set()
         for col in table["columns"]:
-            # Handle either string columns or dictionary columns
-            if isinstance(col, dict):
-                col_name = col["name"]
-                col_type = col.get("type", "string").lower()
-                
-                # Handle primary key
-                if col_name == "id":
-                    columns.append(Column(col_name, Integer, primary_key=True))
-                # Handle foreign key
-                elif "foreign_key" in col:
-                    fk_reference = col["foreign_key"]
-                    # Extract table and column names from the foreign key reference
-                    # Format is typically "table_name(column_name)"
-                    fk_table = fk_reference.split('(')[0]
-                    columns.append(Column(col_name, Integer, ForeignKey(fk_reference)))
-                # Handle other columns based on type
-                else:
-                    if col_type == "integer":
-                        columns.append(Column(col_name, Integer))
-                    else:  # Default to String for all other types
-                        columns.append(Column(col_name, String))
-            else:
-                # If column is just a string (old format)
-                if col == "id":
-                    columns.append(Column(col, Integer, primary_key=True))
+            col_name = identifier(col["name"])
+            if col_name in seen:
+                continue
+            seen.add(col_name)
+            spec = model_column_spec(col, tables)
+            args = []
+            kwargs = {}
+            if col_name == "id" or col.get("primary_key"):
+                kwargs["primary_key"] = True
+            elif col.get("foreign_key"):
+                target, _, problem = resolve_foreign_key(col, tables)
+                if target:
+                    args.append(ForeignKey(target))
+                    spec = {**spec, "references": target}
                 else:
-                    columns.append(Column(col, String))
-        
-        tables[name] = Table(name, metadata, *columns)
-    
-    # We no longer need to process relationships separately as they're already included
-    # in the column definitions
-    
-    # Create all tables at once
+                    plan["warnings"].append(f"{name}.{col_name} {problem}, foreign key skipped")
+            if col.get("nullable") is False or col.get("required") is True:
+                kwargs["nullable"] = False
+            columns.append(Column(col_name, column_type(spec), *args, **kwargs))
+            plan_columns.append({
+                "name": col_name,
+                **spec,
+                **({"primary_key": True} if kwargs.get("primary_key") else {}),
+                **({"nullable": False} if kwargs.get("nullable") is False else {}),
+            })
+        if not any(column.primary_key for column in columns):
+            columns.insert(0, Column("id", Integer, primary_key=True))
+            plan_columns.insert(0, {"name": "id", "kind": "integer", "primary_key": True})
+        sa_tables[name] = Table(name, metadata, *columns)
+        plan["tables"].append({"name": name, "columns": plan_columns})
+
+    for table in tables:
+        sa_table = sa_tables[table["name"]]
+        # Unique columns and unique constraints over several columns, these
+        # also serve the lookups below so they come first
+        for col in table["columns"]:
+            if col.get("unique") and identifier(col["name"]) != "id":
+                add_index(sa_table, [identifier(col["name"])], "unique constraint", unique=True)
+        constraints = table.get("unique_constraints") or table.get("unique")
+        for constraint in constraints if isinstance(constraints, list) else []:
+            names = [constraint] if isinstance(constraint, str) else constraint
+            columns = [identifier(n) for n in names if isinstance(n, str)] if isinstance(names, list) else []
+            if columns and all(c in sa_table.c for c in columns):
+                add_index(sa_table, columns, "unique constraint", unique=True)
+        # Joins on foreign keys
+        for column in sa_table.columns:
+            if column.foreign_keys:
+                add_index(sa_table, [column.name], f"foreign key to {next(iter(column.foreign_keys)).target_fullname}")
+
+    # Lookups by the API's path and query parameters
+    for table_name, column, reason in endpoint_lookups(api_endpoints, tables):
+        sa_table = sa_tables[table_name]
+        if not sa_table.c[column].primary_key:
+            add_index(sa_table, [column], reason)
+
+    # create_all skips existing tables and the indexes declared on them
+    existing = set(inspect(engine).get_table_names()) & set(sa_tables)
     metadata.create_all(engine)
-    print("✅ Tables created successfully.")
\ No newline at end of file
+    for plan_table in plan["tables"]:
+        plan_table["created"] = plan_table["name"] not in existing
+    for plan_index in plan["indexes"]:
+        plan_index["created"] = plan_index["table"] not in existing
+    for name in sorted(existing):
+        plan["warnings"].append(f"Table {name} already exists, left unchanged")
+
+    created = [t for t in metadata.sorted_tables if t.name not in existing]
+    plan["statements"] = [str(CreateTable(t).compile(engine)).strip() for t in created]
+    plan["statements"] += [
+        str(CreateIndex(index).compile(engine)).strip()
+        for t in created for index in sorted(t.indexes, key=lambda i: i.name)
+    ]
+    created_indexes = sum(1 for index in plan["indexes"] if index["created"])
+    print(f"✅ {len(created)} tables and {created_indexes} indexes created, {len(existing)} tables already existed.")
+    return plan
@@ -3,13 +3,14 @@ import json
 from pathlib import Path
 import graphviz
 from utils.groq_llm import llama3_chat
+from utils.profiling import span
 
-def generate_workflow_graph(output_file="workflow_graph.png"):
+def generate_workflow_graph(output_dir="docs"):
     """
     Generating a visualization of the LangGraph workflow using Graphviz
     
     Args:
-        output_file: Path to save the generated graph image
+        output_dir: Directory to save the generated graph image in
     
     Returns:
         Path to the generated file
@@ -48,11 +49,12 @@ def generate_workflow_graph(output_file="workflow_graph.png"):
         s.node("generate_project")
     
     # Render the graph
-    output_path = dot.render(filename='workflow', directory='docs', format='png', cleanup=True)
+    with span("graphviz"):
+        output_path = dot.render(filename='workflow', directory=output_dir, format='png', cleanup=True)
     
     return output_path
 
-def generate_mermaid_diagram():
+def generate_mermaid_diagram(output_dir="docs"):
     """Generate a Mermaid diagram code for the workflow"""
     
     mermaid_code = """```mermaid
@@ -77,12 +79,13 @@ graph TD
 ```"""
     
     # Save the mermaid diagram code to a file
-    os.makedirs('docs', exist_ok=True)
-    with open('docs/workflow_diagram.md', 'w') as f:
+    os.makedirs(output_dir, exist_ok=True)
+    diagram_path = os.path.join(output_dir, 'workflow_diagram.md')
+    with open(diagram_path, 'w') as f:
         f.write("# SRS Analyzer Workflow\n\n")
         f.write(mermaid_code)
     
-    return 'docs/workflow_diagram.md'
+    return diagram_path
 
 def generate_project_documentation(state, output_dir="docs"):
     """
@@ -127,7 +130,7 @@ def generate_project_documentation(state, output_dir="docs"):
     Use proper Markdown formatting. Keep it professional but friendly.
     """
     
-    readme_content = llama3_chat(readme_prompt)
+    readme_content = llama3_chat(readme_prompt, node="documentation")
     readme_path = os.path.join(output_dir, "README.md")
     with open(readme_path, "w") as f:
         f.write(readme_content)
@@ -157,7 +160,7 @@ def generate_project_documentation(state, output_dir="docs"):
     Format the documentation with proper Markdown, including code blocks for examples.
     """
     
-    api_doc_content = llama3_chat(api_doc_prompt)
+    api_doc_content = llama3_chat(api_doc_prompt, node="documentation")
     api_doc_path = os.path.join(output_dir, "API_DOCUMENTATION.md")
     with open(api_doc_path, "w") as f:
         f.write(api_doc_content)
@@ -165,6 +168,6 @@ def generate_project_documentation(state, output_dir="docs"):
     return {
         "readme": readme_path,
         "api_doc": api_doc_path,
-        "workflow_diagram": generate_mermaid_diagram(),
-        "workflow_graph": generate_workflow_graph()
+        "workflow_diagram": generate_mermaid_diagram(output_dir),
+        "workflow_graph": generate_workflow_graph(output_dir)
     }
\ No newline at end of file
@@ -1,22 +1,91 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
-from utils.config import GROQ_API_KEY
+from utils import metrics
+from utils.config import (
+    GROQ_API_KEY,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_HISTORY,
+    LLM_HEDGE_MAX_RATE,
+    LLM_REQUEST_TIMEOUT_SECONDS,
+    LLM_RATE_LIMIT_PER_MINUTE,
+)
+from utils.profiling import propagate, span
+from utils.rate_limit import RateLimiter
 
+LLM_MODEL = "llama3-70b-8192"
+# Seconds to establish the connection, the answer gets LLM_REQUEST_TIMEOUT_SECONDS
+CONNECT_TIMEOUT_SECONDS = 10
 
-def llama3_chat(prompt: str) -> str:
+# Recent latencies per node, used to decide when to hedge a slow call
+_latencies = defaultdict(lambda: deque(maxlen=LLM_HEDGE_HISTORY))
+# Whether each of the node's recent calls was hedged, to cap its hedge rate
+_recent_hedges = defaultdict(lambda: deque(maxlen=LLM_HEDGE_HISTORY))
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+# Request budget shared by every call, hedged duplicates included
+_rate_limiter = RateLimiter(LLM_RATE_LIMIT_PER_MINUTE) if LLM_RATE_LIMIT_PER_MINUTE > 0 else None
+
+metrics.describe("llm_requests_total", "LLM calls by node")
+metrics.describe("llm_hedged_requests_total", "LLM calls for which a duplicate request was sent")
+metrics.describe("llm_hedge_wins_total", "Hedged LLM calls answered first by the duplicate request")
+metrics.describe("llm_hedge_saved_seconds_total", "Estimated latency saved by hedge wins")
+metrics.describe("llm_hedge_delay_seconds", "Current delay after which a call is hedged")
+metrics.describe("llm_rate_limited_seconds_total", "Time LLM requests waited for the rate limit")
+
+
+def set_rate_limiter(limiter):
+    """Share a RateLimiter with other workers, e.g. the processes of a batch run"""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def llama3_chat(prompt: str, max_tokens: int = 2048, node: str = "default") -> str:
+    data = {
+        "model": LLM_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+    }
+
+    metrics.inc("llm_requests_total", node=node)
+    start = time.monotonic()
+    delay = hedge_delay(node)
+    if delay is None:
+        content = _post(data)
+        hedged = False
+    else:
+        content, hedged = _hedged_post(data, node, delay, start)
+
+    with _lock:
+        _latencies[node].append(time.monotonic() - start)
+        _recent_hedges[node].append(hedged)
+    return content
+
+
+def _post(data):
     url = "https://api.groq.com/openai/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
         "Content-Type": "application/json",
     }
-    data = {
-        "model": "llama3-70b-8192",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,
-        "max_tokens": 2048,
-    }
+
+    if _rate_limiter is not None:
+        with span("llm_rate_limit"):
+            waited = _rate_limiter.acquire()
+        if waited:
+            metrics.inc("llm_rate_limited_seconds_total", round(waited, 3))
 
     try:
-        res = requests.post(url, json=data, headers=headers)
+        with span("llm_request", model=data.get("model"), max_tokens=data.get("max_tokens")):
+            res = requests.post(
+                url, json=data, headers=headers, timeout=(CONNECT_TIMEOUT_SECONDS, LLM_REQUEST_TIMEOUT_SECONDS)
+            )
         if res.status_code == 200:
             response = res.json()
             # Decode the response content to ensure UTF-8 compatibility
@@ -27,4 +96,84 @@ def llama3_chat(prompt: str) -> str:
     except UnicodeEncodeError as e:
         raise Exception(f"Unicode Encoding Error: {str(e)}")
     except Exception as e:
-        raise Exception(f"Error: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error: {str(e)}")
+
+
+def hedge_delay(node):
+    """
+    Delay after which a call of this node is hedged, or None when it should
+    not be hedged (hedging disabled or not enough history yet)
+    """
+    if not LLM_HEDGE_ENABLED:
+        return None
+    with _lock:
+        samples = sorted(_latencies[node])
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    index = min(len(samples) - 1, math.ceil(LLM_HEDGE_PERCENTILE / 100 * len(samples)) - 1)
+    delay = samples[max(index, 0)]
+    metrics.set_gauge("llm_hedge_delay_seconds", round(delay, 3), node=node)
+    return delay
+
+
+def _hedge_allowed(node):
+    with _lock:
+        hedges = _recent_hedges[node]
+        if not hedges:
+            return True
+        return sum(hedges) / len(hedges) < LLM_HEDGE_MAX_RATE
+
+
+def _expected_latency(node, delay):
+    """Mean latency of the node's recent calls that were slower than delay"""
+    with _lock:
+        slow = [latency for latency in _latencies[node] if latency > delay]
+    return sum(slow) / len(slow) if slow else delay
+
+
+def _hedged_post(data, node, delay, start):
+    """
+    Send the request, and a duplicate if no answer came within delay seconds.
+    The first answer wins.
+
+    A blocking requests call cannot be interrupted from another thread, so
+    the losing request keeps running until its answer arrives or it times out
+    after LLM_REQUEST_TIMEOUT_SECONDS. It holds an executor thread, a
+    connection and a slot of the rate limit meanwhile, and its tokens are
+    billed: the cost of a hedge is a full extra request, which is why the
+    hedge rate is capped by LLM_HEDGE_MAX_RATE.
+
+    Returns:
+        (content, hedged)
+    """
+    primary = _executor.submit(propagate(_post), data)
+    done, _ = wait([primary], timeout=delay)
+    if done or not _hedge_allowed(node):
+        return primary.result(), False
+
+    metrics.inc("llm_hedged_requests_total", node=node)
+    hedge = _executor.submit(propagate(_post), data)
+
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                content = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+
+            # Only helps if the loser is still queued, a running one finishes on its own
+            for loser in pending:
+                loser.cancel()
+
+            if future is hedge:
+                metrics.inc("llm_hedge_wins_total", node=node)
+                saved = _expected_latency(node, delay) - (time.monotonic() - start)
+                if saved > 0:
+                    metrics.inc("llm_hedge_saved_seconds_total", round(saved, 3), node=node)
+            return content, True
+
+    raise error
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import re
+import time
+from utils.config import ANALYSIS_STORE_DIR, INCREMENTAL_ANALYSIS_ENABLED, SEED_MAX_CHANGED_SHARE
+from utils.preprocess import relevant_sections, relevant_srs_text, section_text
+from utils.profiling import span
+from utils.templates import parse_json
+
+# Revisions of the same SRS are recognised by their file name and title, with
+# version suffixes such as "_v2", "-rev3" or " (1)" removed, so two different
+# documents both uploaded as "srs.docx" are not taken for revisions.
+VERSION_SUFFIX = re.compile(r'([\s_-]*(v|rev|version)?[\s_.-]?\d+(\.\d+)*|\s*\(\d+\))+$', re.IGNORECASE)
+
+
+def document_key(filename, srs_text=""):
+    stem = os.path.splitext(os.path.basename(filename or "document"))[0]
+    stem = VERSION_SUFFIX.sub("", stem) or stem
+    slug = re.sub(r'[^a-z0-9]+', '-', stem.lower()).strip('-') or "document"
+    return f"{slug}-{input_hash(document_title(srs_text))[:8]}"
+
+
+def document_title(srs_text):
+    """First non-empty line of the document, without markup or version suffix"""
+    for line in (srs_text or "").splitlines():
+        title = " ".join(line.strip("#-| \t").split())
+        if title:
+            return (VERSION_SUFFIX.sub("", title) or title).lower()
+    return ""
+
+
+def same_document(previous, fingerprints):
+    """
+    Whether a stored analysis can be a previous revision of the document,
+    i.e. they share at least one section title
+    """
+    old = (previous or {}).get("fingerprints") or {}
+    return not old or not fingerprints or any(key in old for key in fingerprints)
+
+
+def input_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def canonical(value):
+    """Canonical form of a node output, so reformatted but equal JSON hashes the same"""
+    parsed = parse_json(value)
+    if parsed is None:
+        return "" if value is None else str(value)
+    return json.dumps(parsed, sort_keys=True)
+
+
+def section_fingerprints(srs_text, sections):
+    """
+    Fingerprint every section of the document
+
+    Returns:
+        Dict mapping the section's outline path to the hash of its text
+    """
+    fingerprints = {}
+    for section in sections or []:
+        key = " > ".join(section["outline"]) or f"#{section['id']}"
+        while key in fingerprints:
+            key += "'"
+        fingerprints[key] = section_fingerprint(srs_text, section)
+    return fingerprints
+
+
+def section_fingerprint(srs_text, section):
+    return input_hash(" ".join(section_text(srs_text, section).split()))
+
+
+def diff_sections(old, new):
+    old = old or {}
+    return {
+        "changed": [key for key in new if key in old and old[key] != new[key]],
+        "added": [key for key in new if key not in old],
+        "removed": [key for key in old if key not in new],
+        "unchanged": sum(1 for key in new if old.get(key) == new[key]),
+    }
+
+
+def analysis_path(doc_key):
+    return os.path.join(ANALYSIS_STORE_DIR, f"{doc_key}.json")
+
+
+def load_analysis(doc_key):
+    """Load the stored analysis of a previous version of the document, if any"""
+    if not INCREMENTAL_ANALYSIS_ENABLED:
+        return None
+    try:
+        with open(analysis_path(doc_key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_analysis(doc_key, srs_text, sections, state, workspace_id=None):
+    """Store the fingerprints and outputs of an analysis next to each other"""
+    node_inputs = dict(state.get("node_inputs") or {})
+    if (state.get("generation_cache") or {}).get("failed"):
+        # Not reusable as a whole, the next version generates the missing files
+        node_inputs.pop("project_setup", None)
+    record = {
+        "doc_key": doc_key,
+        "updated_at": time.time(),
+        "workspace": workspace_id,
+        "fingerprints": section_fingerprints(srs_text, sections),
+        "node_inputs": node_inputs,
+        "outputs": {
+            key: state.get(key)
+            for key in ("api_endpoints", "business_logic", "auth_requirements", "db_schema", "setup")
+        },
+        # project_setup may have been reused as a whole, keep its file cache then
+        "generation": state.get("generation_cache")
+        or (state.get("previous_analysis") or {}).get("generation")
+        or {},
+    }
+    os.makedirs(ANALYSIS_STORE_DIR, exist_ok=True)
+    path = analysis_path(doc_key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+    return record
+
+
+def reuse_unchanged(name, output_key, node, topic=None, depends_on=(), version=""):
+    """
+    Wrap a graph node so it reuses the previous analysis' output when its
+    inputs are unchanged
+
+    The inputs of a node are the SRS sections routed to its topic and the
+    outputs of the nodes it depends on, plus a version for settings that
+    change the node's output. Their hash is recorded in
+    state["node_inputs"] so it can be stored with the analysis.
+    """
+    def run(state):
+        key = input_hash(
+            relevant_srs_text(state, topic) if topic else "",
+            *[canonical(state.get(dep)) for dep in depends_on],
+            *([version] if version else []),
+        )
+        node_inputs = {**(state.get("node_inputs") or {}), name: key}
+
+        previous = state.get("previous_analysis") or {}
+        previous_output = (previous.get("outputs") or {}).get(output_key)
+        if previous_output is not None and (previous.get("node_inputs") or {}).get(name) == key:
+            print(f"♻️ Reusing {output_key} from the previous analysis")
+            return {**state, output_key: previous_output, "node_inputs": node_inputs}
+
+        with span(f"node:{name}"):
+            return {**node(state), "node_inputs": node_inputs}
+    return run
+
+
+def seed_output(state, output_key, topic):
+    """
+    Offer the previous analysis' output as a seed when only some of the
+    sections routed to the topic differ from the previous document
+
+    Sections are matched by content, so moved or renamed sections still
+    count as unchanged.
+
+    Returns:
+        None, or (previous output, text of the changed sections, titles of
+        the previous document's sections that no longer appear)
+    """
+    previous = state.get("previous_analysis") or {}
+    previous_output = (previous.get("outputs") or {}).get(output_key)
+    previous_fingerprints = previous.get("fingerprints") or {}
+    if previous_output is None or not previous_fingerprints:
+        return None
+
+    srs_text = state.get("srs_text", "")
+    sections = relevant_sections(state, topic)
+    if sections is None:
+        sections = state.get("srs_sections") or []
+    if not sections:
+        return None
+
+    known = set(previous_fingerprints.values())
+    changed = [section for section in sections if section_fingerprint(srs_text, section) not in known]
+    if len(changed) > SEED_MAX_CHANGED_SHARE * len(sections):
+        return None
+
+    # Sections gone from the document, neither their title nor their text is left
+    current = section_fingerprints(srs_text, state.get("srs_sections"))
+    current_hashes = set(current.values())
+    removed = [
+        key for key, value in previous_fingerprints.items()
+        if key not in current and value not in current_hashes
+    ]
+    return (
+        previous_output,
+        "\n".join(section_text(srs_text, section) for section in changed),
+        removed,
+    )
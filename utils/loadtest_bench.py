@@ -0,0 +1,225 @@
+"""
+Load test of the generated API, one scenario per extracted endpoint.
+
+    python loadtest/bench.py --base-url http://localhost:8000 --concurrency 32 --duration 30
+
+Every scenario runs on its own: <concurrency> workers send requests for
+<duration> seconds after a warm-up, each with path, query and body values
+synthesized from the database schema. Latency percentiles, throughput and
+status codes are printed per scenario and written to --output as JSON, so a
+run can be kept as the performance baseline of the service.
+
+Path ids and foreign keys are drawn from 1..--id-range, so seed the
+database first. DELETE scenarios remove rows, skip them with
+--exclude-method DELETE.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import string
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+
+# Rendered by the analyzer from the extracted api_endpoints and db_schema
+SCENARIOS = []
+
+WORDS = ["alpha", "beta", "gamma", "delta", "omega", "river", "stone", "cloud", "amber", "cedar", "maple", "swift"]
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PERCENTILES = (50, 90, 95, 99)
+
+# Makes strings of unique columns (emails, usernames) distinct across requests
+_counter = itertools.count(1)
+
+
+def synthesize(spec, rng, id_range):
+    """A value for a column spec ({"kind", "length", "references", ...})"""
+    kind = spec.get("kind", "string")
+    if spec.get("references") or spec.get("id"):
+        return rng.randint(1, id_range)
+    if kind in ("integer", "biginteger", "smallinteger"):
+        return rng.randint(spec.get("min", 0), spec.get("max", 1000))
+    if kind == "float":
+        return round(rng.uniform(0, 1000), 3)
+    if kind == "numeric":
+        scale = spec.get("scale", 2)
+        return round(rng.uniform(0, 10 ** min(spec.get("precision", 12) - scale, 6) - 1), scale)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "date":
+        return (date(2020, 1, 1) + timedelta(days=rng.randint(0, 2000))).isoformat()
+    if kind == "datetime":
+        return (EPOCH + timedelta(seconds=rng.randint(0, 2000 * 86400))).isoformat()
+    if kind == "time":
+        return f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+    if kind == "uuid":
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if kind == "json":
+        return {"tag": rng.choice(WORDS)}
+
+    n = next(_counter)
+    name = spec.get("name", "").lower()
+    length = spec.get("length", 255) if kind == "string" else 2000
+    if "email" in name:
+        value = f"user{n}.{rng.randrange(10 ** 6)}@example.com"
+    elif kind == "text":
+        value = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+    elif length < 12:
+        value = "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+    else:
+        value = f"{rng.choice(WORDS)}-{n}-{rng.randrange(10 ** 6)}"
+    return value[:length]
+
+
+def build_request(scenario, rng, id_range):
+    """(method, url path, query params, JSON body) of one request of a scenario"""
+    values = {name: synthesize(spec, rng, id_range) for name, spec in scenario["path_params"].items()}
+    path = re.sub(r'\{(\w+)\}', lambda m: str(values[m.group(1)]), scenario["path"])
+    # Optional filters are left out half of the time, like most real clients do
+    query = {
+        name: synthesize(spec, rng, id_range)
+        for name, spec in scenario["query"].items()
+        if rng.random() < 0.5
+    }
+    body = None
+    if scenario["body"] is not None:
+        body = {name: synthesize(spec, rng, id_range) for name, spec in scenario["body"].items()}
+    return scenario["method"], path, query, body
+
+
+async def worker(client, scenario, deadline, rng, id_range, samples, statuses):
+    while time.perf_counter() < deadline:
+        method, path, query, body = build_request(scenario, rng, id_range)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, params=query, json=body)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        samples.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+async def run_phase(client, scenario, args, seconds, seed):
+    samples = []
+    statuses = {}
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(client, scenario, deadline, random.Random(f"{seed}:{i}"), args.id_range, samples, statuses)
+        for i in range(args.concurrency)
+    ))
+    return samples, statuses, time.perf_counter() - start
+
+
+def percentile(sorted_samples, p):
+    """Nearest-rank percentile of sorted samples"""
+    if not sorted_samples:
+        return None
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+def summarize(scenario, samples, statuses, elapsed):
+    samples.sort()
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        "scenario": scenario["name"],
+        "method": scenario["method"],
+        "path": scenario["path"],
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": ms(sum(samples) / len(samples)) if samples else None,
+            **{f"p{p}": ms(percentile(samples, p)) for p in PERCENTILES},
+            "max": ms(samples[-1]) if samples else None,
+        },
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def print_report(results):
+    header = f"{'scenario':<40} {'reqs':>7} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        latency = r["latency_ms"]
+        cells = [latency[key] for key in ("p50", "p90", "p95", "p99", "max")]
+        print(
+            f"{r['scenario'][:40]:<40} {r['requests']:>7} {r['throughput_rps'] or 0:>8} "
+            + " ".join(f"{c if c is not None else '-':>8}" for c in cells)
+            + f" {r['errors']:>7}"
+        )
+    print("(latencies in ms)")
+
+
+async def run(args):
+    scenarios = [
+        s for s in SCENARIOS
+        if (not args.scenario or any(pattern in s["name"] for pattern in args.scenario))
+        and s["method"] not in args.exclude_method
+    ]
+    if not scenarios:
+        print("No scenario selected")
+        return []
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {name.strip(): value.strip() for name, value in (h.split(":", 1) for h in args.header)}
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout, headers=headers) as client:
+        for scenario in scenarios:
+            print(f"{scenario['name']}: {args.concurrency} workers for {args.duration}s", file=sys.stderr)
+            if args.warmup > 0:
+                await run_phase(client, scenario, args, args.warmup, f"warmup:{scenario['name']}")
+            samples, statuses, elapsed = await run_phase(client, scenario, args, args.duration, scenario["name"])
+            results.append(summarize(scenario, samples, statuses, elapsed))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test every endpoint of the generated API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="Concurrent requests per scenario")
+    parser.add_argument("-d", "--duration", type=float, default=30, help="Seconds each scenario is measured")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds each scenario runs before measuring")
+    parser.add_argument("--timeout", type=float, default=30, help="Request timeout in seconds")
+    parser.add_argument("--id-range", type=int, default=1000, help="Path ids and foreign keys are drawn from 1..N")
+    parser.add_argument("-s", "--scenario", action="append", default=[], help="Only run scenarios whose name contains this")
+    parser.add_argument("--exclude-method", action="append", default=[], type=str.upper, help="Skip scenarios of this HTTP method")
+    parser.add_argument("-H", "--header", action="append", default=[], help="Extra request header, e.g. 'Authorization: Bearer ...'")
+    parser.add_argument("-o", "--output", default="loadtest/results.json", help="JSON report path")
+    parser.add_argument("--list", action="store_true", help="List the scenarios and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for s in SCENARIOS:
+            print(f"{s['name']:<40} {s['method']:<7} {s['path']}")
+        return
+
+    results = asyncio.run(run(args))
+    if not results:
+        return
+    print_report(results)
+    report = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
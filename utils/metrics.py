@@ -0,0 +1,56 @@
+import threading
+
+# Minimal in-process metrics registry, rendered in the Prometheus text format
+# by the /metrics endpoint.
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_help = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get(name, **labels):
+    key = _key(name, labels)
+    with _lock:
+        return _counters.get(key, _gauges.get(key, 0))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    with _lock:
+        series = [("counter", k, v) for k, v in _counters.items()]
+        series += [("gauge", k, v) for k, v in _gauges.items()]
+
+    lines = []
+    declared = set()
+    for kind, (name, labels), value in sorted(series, key=lambda s: s[1]):
+        if name not in declared:
+            declared.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
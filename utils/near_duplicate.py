@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import random
+import re
+from contextlib import contextmanager
+from utils.config import ANALYSIS_STORE_DIR, NEAR_DUPLICATE_THRESHOLD
+from utils.preprocess import section_text
+
+try:
+    import fcntl
+except ImportError:  # Windows, concurrent updates of the index are then not serialized
+    fcntl = None
+
+# MinHash signatures of every analyzed document, with an LSH index over them
+# so a new upload is only compared with documents that share a band.
+# Shingles are word 5-grams taken within each section, so they never span
+# a section boundary. With 16 bands of 4 rows, documents with a Jaccard
+# similarity of 0.8 share a band with probability ~0.9999, at 0.3 only ~0.12.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+INDEX_FILE = "minhash_index.json"
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(srs_text, sections):
+    """64-bit hashes of the word shingles of every section"""
+    chunks = [section_text(srs_text, section) for section in sections] if sections else [srs_text]
+    hashes = set()
+    for chunk in chunks:
+        words = re.findall(r'\w+', chunk.lower())
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1)):
+            shingle = " ".join(words[i:i + SHINGLE_SIZE])
+            if shingle:
+                hashes.add(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"))
+    return hashes
+
+
+def document_signature(srs_text, sections):
+    """MinHash signature of a document, or None if it has no words"""
+    hashes = shingles(srs_text, sections)
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the shingle sets of two documents"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERM
+
+
+def band_keys(signature):
+    return [
+        f"{band}:" + hashlib.sha1(",".join(map(str, signature[band * ROWS:(band + 1) * ROWS])).encode()).hexdigest()[:16]
+        for band in range(BANDS)
+    ]
+
+
+def index_path():
+    return os.path.join(ANALYSIS_STORE_DIR, INDEX_FILE)
+
+
+def load_index():
+    try:
+        with open(index_path(), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {"documents": {}, "buckets": {}}
+    if index.get("num_perm") != NUM_PERM or index.get("bands") != BANDS:
+        # Signatures built with other parameters cannot be compared
+        return {"documents": {}, "buckets": {}}
+    return index
+
+
+@contextmanager
+def locked_index():
+    os.makedirs(ANALYSIS_STORE_DIR, exist_ok=True)
+    with open(index_path() + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def index_document(doc_key, signature):
+    """Add or replace a document's signature in the index on disk"""
+    if signature is None:
+        return
+    with locked_index():
+        index = load_index()
+        previous = index["documents"].get(doc_key)
+        if previous is not None:
+            for key in band_keys(previous):
+                bucket = index["buckets"].get(key, [])
+                if doc_key in bucket:
+                    bucket.remove(doc_key)
+                if not bucket:
+                    index["buckets"].pop(key, None)
+        index["documents"][doc_key] = signature
+        for key in band_keys(signature):
+            bucket = index["buckets"].setdefault(key, [])
+            if doc_key not in bucket:
+                bucket.append(doc_key)
+
+        path = index_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"num_perm": NUM_PERM, "bands": BANDS, **index}, f)
+        os.replace(tmp_path, path)
+
+
+def find_near_duplicate(signature, exclude=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Find the analyzed document most similar to a signature
+
+    Returns:
+        (doc_key, similarity) of the best match at or above threshold, or None
+    """
+    if signature is None:
+        return None
+    index = load_index()
+    candidates = set()
+    for key in band_keys(signature):
+        candidates.update(index["buckets"].get(key, []))
+    candidates.discard(exclude)
+
+    best = None
+    for doc_key in candidates:
+        score = similarity(signature, index["documents"][doc_key])
+        if score >= threshold and (best is None or score > best[1]):
+            best = (doc_key, score)
+    return best
@@ -0,0 +1,219 @@
+import json
+import re
+from jsonschema import Draft7Validator
+from utils.groq_llm import llama3_chat
+from utils.config import JSON_REPAIR_MAX_ATTEMPTS
+
+# JSON Schema of every node output. Validation runs right after each node, so
+# a malformed output is repaired (or the run fails) before the rest of the
+# pipeline spends anything on it.
+
+OBJECT_OR_ARRAY = {
+    "anyOf": [
+        {"type": "object", "minProperties": 1},
+        {"type": "array", "minItems": 1},
+    ]
+}
+
+NODE_SCHEMAS = {
+    "api_endpoints": OBJECT_OR_ARRAY,
+    "business_logic": {"type": ["object", "array"]},
+    "auth_requirements": {"type": ["object", "array"]},
+    "db_schema": {
+        "type": "object",
+        "required": ["tables"],
+        "properties": {
+            "tables": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["name", "columns"],
+                    "properties": {
+                        "name": {"type": "string", "minLength": 1},
+                        "columns": {
+                            "type": "array",
+                            "items": {
+                                "anyOf": [
+                                    {"type": "string", "minLength": 1},
+                                    {
+                                        "type": "object",
+                                        "required": ["name"],
+                                        "properties": {"name": {"type": "string", "minLength": 1}},
+                                    },
+                                ]
+                            },
+                        },
+                    },
+                },
+            }
+        },
+    },
+    "setup": {"type": "object", "minProperties": 1},
+    # File manifest returned by the first phase of project_setup
+    "project_manifest": {
+        "type": "object",
+        "required": ["files"],
+        "properties": {
+            "files": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["path"],
+                    "properties": {"path": {"type": "string", "minLength": 1}},
+                },
+            }
+        },
+    },
+}
+
+# Answers the prompts allow when there is nothing to extract, and the JSON they stand for
+EMPTY_ANSWERS = {
+    "business_logic": ("No business logic found", {}),
+    "db_schema": ("No database schema found", {"tables": []}),
+}
+
+# Errors whose fragment is better repaired with its enclosing object as context
+PARENT_CONTEXT_VALIDATORS = {"type", "minLength", "enum", "format", "pattern"}
+MAX_FRAGMENTS_PER_ATTEMPT = 5
+
+
+class NodeOutputError(Exception):
+    def __init__(self, output_key, errors):
+        self.output_key = output_key
+        self.errors = errors
+        super().__init__(f"Invalid {output_key} after repair: {'; '.join(errors)}")
+
+
+def validated(output_key, node):
+    """Wrap a graph node so its output is validated, and repaired if needed"""
+    def run(state):
+        result = node(state)
+        return {**result, output_key: validate_output(output_key, result.get(output_key))}
+    return run
+
+
+def validate_output(output_key, text):
+    """
+    Validate a node output against its schema, repairing it with targeted
+    LLM calls within JSON_REPAIR_MAX_ATTEMPTS
+
+    Returns:
+        The output as a JSON string
+    Raises:
+        NodeOutputError if the output is still invalid after the repair budget
+    """
+    schema = NODE_SCHEMAS[output_key]
+    validator = Draft7Validator(schema)
+
+    instance, parse_error = parse(output_key, text)
+    attempts = 0
+    while True:
+        if parse_error is None:
+            errors = list(validator.iter_errors(instance))
+            if not errors:
+                if attempts:
+                    print(f"✅ Repaired {output_key} in {attempts} attempts")
+                return json.dumps(instance)
+            messages = [describe_error(error) for error in errors]
+        else:
+            messages = [parse_error]
+
+        if attempts >= JSON_REPAIR_MAX_ATTEMPTS:
+            raise NodeOutputError(output_key, messages)
+        attempts += 1
+        print(f"🔧 Repairing {output_key} (attempt {attempts}): {'; '.join(messages)}")
+
+        if parse_error is not None:
+            text = repair_fragment(output_key, json_region(text), [parse_error])
+            instance, parse_error = parse(output_key, text)
+        else:
+            instance = repair_schema_errors(output_key, instance, errors)
+
+
+def parse(output_key, text):
+    """Return (instance, None) or (None, parse error message)"""
+    if isinstance(text, (dict, list)):
+        return text, None
+    text = text or ""
+    empty = EMPTY_ANSWERS.get(output_key)
+    if empty and text.strip().strip('"').rstrip(".").lower() == empty[0].lower():
+        return empty[1], None
+    try:
+        return json.loads(text), None
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(json_region(text)), None
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON: {e.msg} at line {e.lineno} column {e.colno}"
+
+
+def json_region(text):
+    """The part of a response that is meant to be JSON, without surrounding prose"""
+    text = text or ""
+    match = re.search(r'```(?:json)?\s*([\s\S]*?)(?:```|$)', text)
+    if match:
+        text = match.group(1)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=0)
+    return text[start:].strip()
+
+
+def describe_error(error):
+    path = "/".join(str(p) for p in error.absolute_path) or "<root>"
+    return f"{path}: {error.message}"
+
+
+def fragment_path(error):
+    path = list(error.absolute_path)
+    if error.validator in PARENT_CONTEXT_VALIDATORS and path:
+        path = path[:-1]
+    return path
+
+
+def get_at(instance, path):
+    for part in path:
+        instance = instance[part]
+    return instance
+
+
+def set_at(instance, path, value):
+    if not path:
+        return value
+    get_at(instance, path[:-1])[path[-1]] = value
+    return instance
+
+
+def repair_schema_errors(output_key, instance, errors):
+    """Repair only the fragments of the output that failed validation"""
+    fragments = {}
+    for error in errors:
+        path = tuple(fragment_path(error))
+        # A fragment inside another one being repaired is covered by it
+        if any(path[:len(other)] == other for other in fragments):
+            continue
+        fragments = {other: msgs for other, msgs in fragments.items() if other[:len(path)] != path}
+        fragments.setdefault(path, []).append(describe_error(error))
+
+    for path, messages in list(fragments.items())[:MAX_FRAGMENTS_PER_ATTEMPT]:
+        fragment = json.dumps(get_at(instance, list(path)), indent=2)
+        try:
+            repaired = json.loads(json_region(repair_fragment(output_key, fragment, messages, path)))
+        except json.JSONDecodeError:
+            continue
+        instance = set_at(instance, list(path), repaired)
+    return instance
+
+
+def repair_fragment(output_key, fragment, messages, path=()):
+    """Ask the LLM to fix one fragment, sending only the fragment and its errors"""
+    location = "/".join(str(p) for p in path) or "the whole document"
+    prompt = f"""The following JSON fragment ({location} of the extracted {output_key}) is invalid.
+    Fix only these errors and keep everything else unchanged:
+    {chr(10).join(f"- {message}" for message in messages)}
+
+    Return only the corrected JSON fragment, do not include any other information and give json only dont add any other text.
+
+    Fragment:
+    {fragment}
+    """
+    return llama3_chat(prompt, node="json_repair")
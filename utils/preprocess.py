@@ -1,6 +1,344 @@
-from docx import Document
+import math
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import Counter
+from utils.config import SECTION_ROUTING_ENABLED, SECTION_ROUTING_MIN_RECALL
 
-def read_docx(path):
-    doc = Document(path)
-    text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
-    return text.strip()
\ No newline at end of file
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = f"{W_NS}body"
+W_P = f"{W_NS}p"
+W_TR = f"{W_NS}tr"
+W_TC = f"{W_NS}tc"
+W_T = f"{W_NS}t"
+W_TAB = f"{W_NS}tab"
+W_BR = f"{W_NS}br"
+W_PPR = f"{W_NS}pPr"
+W_PSTYLE = f"{W_NS}pStyle"
+W_NUMPR = f"{W_NS}numPr"
+W_OUTLINE_LVL = f"{W_NS}outlineLvl"
+W_STYLE = f"{W_NS}style"
+W_NAME = f"{W_NS}name"
+W_VAL = f"{W_NS}val"
+W_STYLE_ID = f"{W_NS}styleId"
+
+
+# Keywords used to route SRS sections to the extractor nodes
+TOPIC_KEYWORDS = {
+    "api": [
+        "api", "endpoint", "rest", "request", "response", "get", "post", "put", "delete",
+        "patch", "route", "url", "http", "parameter", "payload", "json", "crud", "websocket",
+        "interface", "service",
+    ],
+    "logic": [
+        "rule", "workflow", "process", "approval", "approve", "reject", "calculate",
+        "calculation", "compute", "validation", "validate", "status", "business", "logic",
+        "notification", "notify", "condition", "policy", "constraint", "functionality",
+        "feature", "shall", "must",
+    ],
+    "auth": [
+        "authentication", "authorization", "authenticate", "authorize", "auth", "login",
+        "logout", "password", "token", "jwt", "oauth", "role", "rbac", "permission",
+        "access", "security", "session", "sso", "admin", "credential", "privilege",
+    ],
+    "db": [
+        "database", "table", "column", "schema", "field", "entity", "model", "relationship",
+        "foreign", "primary", "key", "record", "store", "data", "attribute", "postgresql",
+        "sql", "index", "unique", "type",
+    ],
+}
+
+STOPWORDS = {
+    "the", "and", "for", "are", "with", "that", "this", "from", "will", "can", "all", "has",
+    "have", "not", "its", "into", "each", "such", "their", "they", "which", "also", "any",
+    "other", "should", "may", "been", "was", "were", "able", "using", "use", "used", "via",
+    "an", "as", "at", "be", "by", "if", "in", "is", "it", "of", "on", "or", "to",
+}
+
+
+def read_docx(source):
+    """
+    Read the text of a .docx file, including headings, lists and tables
+
+    Args:
+        source: Path or seekable binary file object of the .docx
+
+    Returns:
+        The document text, with headings rendered as "#" markdown headings,
+        list items prefixed with "- " and table rows as "cell | cell"
+    """
+    return read_srs(source)[0]
+
+
+def read_srs(source):
+    """
+    Read the text of a .docx file together with its section index
+
+    Returns:
+        (srs_text, sections) where sections is the index built by
+        build_section_index from the document's heading styles
+    """
+    lines = []
+    headings = []
+    for block in iter_docx_blocks(source):
+        if block["type"] == "heading":
+            headings.append((len(lines), block["level"], block["text"]))
+            lines.append(f"{'#' * block['level']} {block['text']}")
+        elif block["type"] == "table_row":
+            lines.append(" | ".join(block["cells"]))
+        elif block["list"]:
+            lines.append(f"- {block['text']}")
+        else:
+            lines.append(block["text"])
+    return "\n".join(lines), build_section_index(lines, headings)
+
+
+def build_section_index(lines, headings):
+    """
+    Split the document into one section per heading
+
+    Args:
+        lines: Lines of the rendered document text
+        headings: (line number, level, title) of every heading line
+
+    Returns:
+        List of sections, each with its title, level, outline path, the
+        [start, end) byte range of the section in the UTF-8 encoded text,
+        its top TF-IDF keywords and keyword hits per extractor topic
+    """
+    # Byte offset of the start of every line in "\n".join(lines)
+    offsets = []
+    position = 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line.encode("utf-8")) + 1
+    total = max(position - 1, 0)
+
+    bounds = [(0, 0, "")] if not headings or headings[0][0] > 0 else []
+    bounds += headings
+    sections = []
+    outline = []
+    for i, (line_no, level, title) in enumerate(bounds):
+        end_line = bounds[i + 1][0] if i + 1 < len(bounds) else len(lines)
+        if level:
+            outline = [entry for entry in outline if entry[0] < level] + [(level, title)]
+        sections.append({
+            "id": i,
+            "title": title,
+            "level": level,
+            "outline": [entry[1] for entry in outline] if level else [],
+            "start": offsets[line_no] if line_no < len(offsets) else total,
+            "end": offsets[end_line] - 1 if end_line < len(offsets) else total,
+            "terms": Counter(tokenize("\n".join(lines[line_no:end_line]))),
+        })
+
+    # TF-IDF signatures
+    document_frequency = Counter()
+    for section in sections:
+        document_frequency.update(section["terms"].keys())
+    for section in sections:
+        terms = section.pop("terms")
+        length = sum(terms.values()) or 1
+        weights = {
+            term: (count / length) * (math.log((len(sections) + 1) / (document_frequency[term] + 1)) + 1)
+            for term, count in terms.items()
+        }
+        section["keywords"] = [term for term, _ in sorted(weights.items(), key=lambda kv: -kv[1])[:8]]
+        section["topics"] = {
+            topic: sum(terms[stem(word)] for word in words)
+            for topic, words in TOPIC_KEYWORDS.items()
+        }
+        # Headings are a strong signal, e.g. "Security Requirements" for auth
+        title_terms = set(tokenize(section["title"]))
+        for topic, words in TOPIC_KEYWORDS.items():
+            if title_terms & {stem(word) for word in words}:
+                section["topics"][topic] += 5
+    return sections
+
+
+def stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def tokenize(text):
+    return [
+        stem(word) for word in re.findall(r'[a-z][a-z0-9_]+', text.lower())
+        if word not in STOPWORDS
+    ]
+
+
+def section_text(srs_text, section):
+    return srs_text.encode("utf-8")[section["start"]:section["end"]].decode("utf-8", errors="ignore")
+
+
+def relevant_srs_text(state, topic, min_recall=SECTION_ROUTING_MIN_RECALL):
+    """
+    Return only the SRS sections relevant to an extractor topic
+
+    Sections are taken in order of their keyword hits for the topic until
+    they cover min_recall of all the topic's hits in the document. The full
+    text is returned when routing is disabled, the document has no headings
+    or nothing in it matches the topic.
+    """
+    srs_text = state.get("srs_text", "")
+    selected = relevant_sections(state, topic, min_recall)
+    if selected is None:
+        return srs_text
+    return "\n".join(section_text(srs_text, section) for section in selected)
+
+
+def relevant_sections(state, topic, min_recall=SECTION_ROUTING_MIN_RECALL):
+    """
+    The sections relevant_srs_text sends for a topic, in document order, or
+    None when the full text is sent
+    """
+    sections = state.get("srs_sections") or []
+    if not SECTION_ROUTING_ENABLED or len(sections) < 2:
+        return None
+
+    total_hits = sum(section["topics"].get(topic, 0) for section in sections)
+    if total_hits == 0:
+        return None
+
+    selected = []
+    covered = 0
+    for section in sorted(sections, key=lambda s: -s["topics"].get(topic, 0)):
+        if covered >= min_recall * total_hits or section["topics"].get(topic, 0) == 0:
+            break
+        selected.append(section)
+        covered += section["topics"].get(topic, 0)
+
+    # Keep the document order so the excerpt still reads naturally
+    selected.sort(key=lambda s: s["start"])
+    return selected
+
+
+def iter_docx_blocks(source):
+    """
+    Stream the blocks of word/document.xml without building the whole DOM
+
+    Yields dicts of the form:
+        {"type": "heading", "level": int, "text": str}
+        {"type": "paragraph", "text": str, "list": bool}
+        {"type": "table_row", "cells": [str]}
+    """
+    with zipfile.ZipFile(source) as docx:
+        heading_styles = read_heading_styles(docx)
+        with docx.open("word/document.xml") as stream:
+            yield from parse_document_xml(stream, heading_styles)
+
+
+def read_heading_styles(docx):
+    """Map paragraph style ids to heading levels using word/styles.xml"""
+    levels = {}
+    try:
+        with docx.open("word/styles.xml") as stream:
+            for _, elem in ET.iterparse(stream):
+                if elem.tag != W_STYLE:
+                    continue
+                style_id = elem.get(W_STYLE_ID)
+                name = elem.find(W_NAME)
+                name = name.get(W_VAL, "") if name is not None else ""
+                outline = elem.find(f"{W_PPR}/{W_OUTLINE_LVL}")
+                match = re.match(r'heading\s*(\d)$', name, re.IGNORECASE)
+                if match:
+                    levels[style_id] = int(match.group(1))
+                elif name.lower() == "title":
+                    levels[style_id] = 1
+                elif outline is not None and outline.get(W_VAL, "").isdigit() and int(outline.get(W_VAL)) < 9:
+                    # Outline levels 0-8 are headings, 9 is body text
+                    levels[style_id] = int(outline.get(W_VAL)) + 1
+                elem.clear()
+    except KeyError:
+        pass
+    return levels
+
+
+def heading_level(paragraph, heading_styles):
+    ppr = paragraph.find(W_PPR)
+    if ppr is None:
+        return None
+    outline = ppr.find(W_OUTLINE_LVL)
+    if outline is not None and outline.get(W_VAL, "").isdigit():
+        # Level 9 is body text, which overrides a heading style
+        level = int(outline.get(W_VAL))
+        return level + 1 if level < 9 else None
+    style = ppr.find(W_PSTYLE)
+    if style is None:
+        return None
+    style_id = style.get(W_VAL, "")
+    if style_id in heading_styles:
+        return heading_styles[style_id]
+    # Documents without styles.xml still use the built-in style ids
+    match = re.match(r'heading\s*(\d)$', style_id, re.IGNORECASE)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def is_list_item(paragraph):
+    ppr = paragraph.find(W_PPR)
+    if ppr is None:
+        return False
+    if ppr.find(W_NUMPR) is not None:
+        return True
+    style = ppr.find(W_PSTYLE)
+    return style is not None and style.get(W_VAL, "").lower().startswith("list")
+
+
+def paragraph_text(paragraph):
+    parts = []
+    for elem in paragraph.iter():
+        if elem.tag == W_T and elem.text:
+            parts.append(elem.text)
+        elif elem.tag == W_TAB:
+            parts.append("\t")
+        elif elem.tag == W_BR:
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def parse_document_xml(stream, heading_styles):
+    body = None
+    # One list of paragraph texts per open table cell, one list of cells per open row
+    cells = []
+    rows = []
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == W_BODY:
+                body = elem
+            elif tag == W_TR:
+                rows.append([])
+            elif tag == W_TC:
+                cells.append([])
+            continue
+
+        if tag == W_P:
+            text = paragraph_text(elem)
+            if cells:
+                if text:
+                    cells[-1].append(text)
+            elif text:
+                level = heading_level(elem, heading_styles)
+                if level:
+                    yield {"type": "heading", "level": level, "text": text}
+                else:
+                    yield {"type": "paragraph", "text": text, "list": is_list_item(elem)}
+        elif tag == W_TC:
+            rows[-1].append(" ".join(cells.pop()))
+        elif tag == W_TR:
+            row = rows.pop()
+            if cells:
+                # Nested table, flatten it into the enclosing cell
+                cells[-1].append(" | ".join(row))
+            elif any(row):
+                yield {"type": "table_row", "cells": row}
+        else:
+            continue
+
+        # Drop everything parsed so far to keep memory bounded
+        elem.clear()
+        if not cells and body is not None:
+            body.clear()
@@ -0,0 +1,186 @@
+import cProfile
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from utils.config import PROFILING_SAMPLE_INTERVAL_SECONDS
+
+# On-demand profiling of one analysis. A session combines:
+#   - cProfile of the calls made through ProfileSession.call, saved as pstats
+#   - a sampler reading the stacks of the threads working for the profiled
+#     run (LLM calls and file generation run in worker threads cProfile does
+#     not see), saved as collapsed stacks for flamegraph.pl or speedscope
+#   - the wall-clock spans recorded with span(), saved in the Chrome trace
+#     event format for chrome://tracing or Perfetto
+# Only one session runs per process at a time, cProfile cannot be enabled
+# twice. Requests served meanwhile are left out: the session is only visible
+# through a context variable set by ProfileSession.call, worker threads join
+# it through propagate(), and threads waiting on a lock, queue or socket
+# selector are not sampled.
+
+PROFILE_DIR = "profile"
+ARTIFACTS = {
+    "pstats": "profile.pstats",
+    "collapsed_stacks": "stacks.collapsed",
+    "trace": "trace.json",
+}
+
+_session_lock = threading.Lock()
+# Session of the profiled run the current thread works for
+_current = contextvars.ContextVar("profile_session", default=None)
+
+# Modules whose frame on top of a stack means the thread is idle, waiting
+IDLE_MODULES = {"threading.py", "queue.py", "selectors.py"}
+
+
+class ProfilingBusy(Exception):
+    pass
+
+
+class ProfileSession:
+    """
+    Usage:
+        with ProfileSession() as session:
+            result = session.call(fn)
+        session.save(directory)
+    """
+
+    def __init__(self, interval=PROFILING_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.profiler = cProfile.Profile()
+        self.samples = Counter()
+        self.spans = []
+        self.thread_names = {}
+        # Threads working for the run, with how many calls each is inside of
+        self._threads = Counter()
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self.start = None
+        self.wall_seconds = None
+
+    def __enter__(self):
+        if not _session_lock.acquire(blocking=False):
+            raise ProfilingBusy("A profiled analysis is already running, try again later")
+        self.start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        self.wall_seconds = round(time.perf_counter() - self.start, 3)
+        _session_lock.release()
+
+    def call(self, fn):
+        """Run fn() under cProfile in the current thread"""
+        return self.run(lambda: self.profiler.runcall(fn))
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn in the current thread as part of the profiled run"""
+        token = _current.set(self)
+        self._join(threading.get_ident())
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._leave(threading.get_ident())
+            _current.reset(token)
+
+    def _join(self, ident):
+        with self._threads_lock:
+            self._threads[ident] += 1
+
+    def _leave(self, ident):
+        with self._threads_lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                working = set(self._threads)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident not in working or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                thread = names.get(ident, str(ident))
+                self.samples[";".join([thread] + stack[::-1])] += 1
+
+    def add_span(self, name, start, end, args):
+        ident = threading.get_ident()
+        self.thread_names.setdefault(ident, threading.current_thread().name)
+        self.spans.append({
+            "name": name,
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": ident,
+            "args": args,
+        })
+
+    def save(self, directory):
+        """Write the artifacts to directory, returns their file names"""
+        os.makedirs(directory, exist_ok=True)
+        self.profiler.dump_stats(os.path.join(directory, ARTIFACTS["pstats"]))
+        with open(os.path.join(directory, ARTIFACTS["collapsed_stacks"]), "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        thread_events = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+            for ident, name in self.thread_names.items()
+        ]
+        with open(os.path.join(directory, ARTIFACTS["trace"]), "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": thread_events + sorted(self.spans, key=lambda s: s["ts"])}, f)
+        return dict(ARTIFACTS)
+
+    def summary(self):
+        """Seconds spent in spans by name, to tell at a glance where the time went"""
+        totals = Counter()
+        for span_event in self.spans:
+            totals[span_event["name"]] += span_event["dur"] / 1e6
+        return {
+            "wall_seconds": self.wall_seconds,
+            "samples": sum(self.samples.values()),
+            "span_seconds": {name: round(seconds, 3) for name, seconds in totals.most_common()},
+        }
+
+
+def propagate(fn):
+    """
+    Wrap fn so it runs as part of the caller's profiled run, if any, in the
+    worker thread it is handed to, e.g. by an executor
+    """
+    session = _current.get()
+    if session is None:
+        return fn
+    return lambda *args, **kwargs: session.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def span(name, **args):
+    """Record a wall-clock span in the profiled run of the current thread, if any"""
+    session = _current.get()
+    if session is None:
+        yield
+        return
+    # Also samples threads the run's context was copied to, e.g. by LangGraph
+    ident = threading.get_ident()
+    session._join(ident)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.add_span(name, start, time.perf_counter(), args)
+        session._leave(ident)
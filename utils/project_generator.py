@@ -1,9 +1,23 @@
 import os
 import json
+import hashlib
+import shutil
 import subprocess
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from utils.code_validator import validate_and_refine_project
+from utils.config import VENV_CACHE_DIR, VENV_CACHE_MAX_AGE_SECONDS, VENV_CACHE_MAX_BYTES
+from utils.profiling import span
+from utils.workspace import directory_size
+
+try:
+    import fcntl
+except ImportError:  # Windows, where every project has its own venv anyway
+    fcntl = None
+
+# Written in a venv once its requirements are installed
+VENV_MARKER = ".requirements.sha256"
 
 
 def generate_project_structure(structure_json: dict, output_dir: str = None):
@@ -23,6 +37,9 @@ def generate_project_structure(structure_json: dict, output_dir: str = None):
         
         # Process the structure recursively
         process_structure(structure, base_dir)
+
+        # A workspace seeded from a previous version still has its files
+        remove_stale_files(base_dir, structure_files(structure))
         
         # Make setup.sh executable if it exists
         setup_file = base_dir / "setup.sh"
@@ -33,10 +50,6 @@ def generate_project_structure(structure_json: dict, output_dir: str = None):
         if os.name == 'nt' and not (base_dir / "setup.bat").exists() and setup_file.exists():
             create_windows_batch_file(setup_file, base_dir / "setup.bat")
 
-        # #Validating and refine generated code
-        refinement_stats = validate_and_refine_project(str(base_dir))
-
-
         print(f"✅ Project structure generated successfully in {output_dir}")
         return True, f"Project created in {output_dir}"
     except json.JSONDecodeError as e:
@@ -111,6 +124,10 @@ def process_structure(structure, parent_dir):
             # It's a file
             # Ensure parent directory exists
             path.parent.mkdir(exist_ok=True, parents=True)
+
+            # Leave files unchanged since the previous analysis untouched
+            if path.is_file() and path.read_text(encoding='utf-8', errors='replace') == str(value):
+                continue
             
             with open(path, 'w', encoding='utf-8') as f:
                 f.write(str(value))
@@ -119,6 +136,38 @@ def process_structure(structure, parent_dir):
             if path.suffix == '.py' and os.name == 'nt':
                 fix_line_endings(path)
 
+def structure_files(structure, prefix=""):
+    """Relative paths of the files in the structure"""
+    files = set()
+    for key, value in structure.items():
+        if key.endswith('/'):
+            if isinstance(value, dict):
+                files |= structure_files(value, f"{prefix}{key}")
+        else:
+            files.add(f"{prefix}{key}")
+    return files
+
+def remove_stale_files(base_dir, files):
+    """
+    Delete the files of base_dir that are not in the structure, and the
+    directories left empty. The venv, caches, dotfiles and setup.bat are kept.
+    """
+    visited = []
+    for root, dirs, names in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if d not in ("venv", "__pycache__") and not d.startswith('.')]
+        relative = Path(root).relative_to(base_dir)
+        visited.append(root)
+        for name in names:
+            path = (relative / name).as_posix()
+            if name.startswith('.') or path == "setup.bat" or path in files:
+                continue
+            os.remove(os.path.join(root, name))
+            print(f"🧹 Removed {path}, no longer part of the project")
+    # Deepest first, so parents emptied by their children go too
+    for root in reversed(visited[1:]):
+        if not os.listdir(root):
+            os.rmdir(root)
+
 def fix_line_endings(file_path):
     """Fix line endings in text files for Windows"""
     try:
@@ -142,39 +191,141 @@ def make_executable(path):
 
 def setup_virtual_env(project_dir):
     """
-    Create and set up a virtual environment for the project
+    Set up the virtual environment of the project
+
+    Environments are shared by requirements: the one for a requirements.txt
+    is built once in VENV_CACHE_DIR/<sha256 of requirements.txt> and the
+    project's venv is a link to it, so a new revision of a document (which
+    gets a new workspace) skips pip while its requirements are unchanged.
     """
     try:
         venv_path = os.path.join(project_dir, "venv")
-        
-        # Create virtual environment
-        subprocess.check_call([sys.executable, "-m", "venv", venv_path])
-        
-        # Determine the pip and activate script paths based on OS
-        if os.name == 'nt':  # Windows
-            pip_path = os.path.join(venv_path, "Scripts", "pip.exe")
-            activate_path = os.path.join(venv_path, "Scripts", "activate.bat")
-        else:  # Unix/Linux/Mac
-            pip_path = os.path.join(venv_path, "bin", "pip")
-            activate_path = os.path.join(venv_path, "bin", "activate")
-        
-        # Install requirements if they exist
         req_file = os.path.join(project_dir, "requirements.txt")
-        if os.path.exists(req_file):
-            try:
-                subprocess.check_call([pip_path, "install", "-r", req_file])
-            except subprocess.CalledProcessError:
-                # Fallback approach if direct pip call fails
-                if os.name == 'nt':
-                    activate_cmd = f"{activate_path} && pip install -r {req_file}"
-                    subprocess.check_call(activate_cmd, shell=True)
-                else:
-                    activate_cmd = f"source {activate_path} && pip install -r {req_file}"
-                    subprocess.check_call(activate_cmd, shell=True, executable='/bin/bash')
-            
-        print(f"✅ Virtual environment set up at {venv_path}")
-        print(f"To activate: {activate_path}")
+        req_hash = file_hash(req_file) if os.path.exists(req_file) else hashlib.sha256(b"").hexdigest()
+
+        if os.name == 'nt':
+            # Directory links need privileges on Windows, every project gets its own venv
+            if venv_ready(venv_path, req_hash):
+                print(f"♻️ Reusing virtual environment at {venv_path}")
+                return True, f"Virtual environment reused at {venv_path}"
+            build_virtual_env(venv_path, req_file, req_hash)
+            return True, f"Virtual environment set up at {venv_path}"
+
+        shared_path = os.path.join(VENV_CACHE_DIR, req_hash)
+        os.makedirs(VENV_CACHE_DIR, exist_ok=True)
+        prune_venv_cache(keep=shared_path)
+        # Runs with the same requirements wait for the one building the environment
+        with locked(f"{shared_path}.lock"):
+            reused = venv_ready(shared_path, req_hash)
+            if reused:
+                os.utime(os.path.join(shared_path, VENV_MARKER))
+            else:
+                build_virtual_env(shared_path, req_file, req_hash)
+
+        if os.path.islink(venv_path) or os.path.isfile(venv_path):
+            os.remove(venv_path)
+        elif os.path.isdir(venv_path):
+            # A venv built in the project before environments were shared
+            shutil.rmtree(venv_path)
+        os.symlink(shared_path, venv_path, target_is_directory=True)
+
+        if reused:
+            print(f"♻️ Reusing virtual environment {shared_path} for {venv_path}")
+            return True, f"Virtual environment reused at {venv_path}"
         return True, f"Virtual environment set up at {venv_path}"
     except Exception as e:
         print(f"❌ Error setting up virtual environment: {str(e)}")
-        return False, f"Error setting up virtual environment: {str(e)}"
\ No newline at end of file
+        return False, f"Error setting up virtual environment: {str(e)}"
+
+def venv_ready(venv_path, req_hash):
+    """Whether a venv was completely built for requirements hashing to req_hash"""
+    try:
+        with open(os.path.join(venv_path, VENV_MARKER), 'r') as f:
+            return f.read().strip() == req_hash
+    except OSError:
+        return False
+
+def build_virtual_env(venv_path, req_file, req_hash):
+    """Create a venv and install the requirements, the marker is written last"""
+    if os.path.isdir(venv_path):
+        # Left over by an interrupted build or built for other requirements
+        shutil.rmtree(venv_path)
+
+    # Create virtual environment
+    subprocess.check_call([sys.executable, "-m", "venv", venv_path])
+
+    # Determine the pip and activate script paths based on OS
+    if os.name == 'nt':  # Windows
+        pip_path = os.path.join(venv_path, "Scripts", "pip.exe")
+        activate_path = os.path.join(venv_path, "Scripts", "activate.bat")
+    else:  # Unix/Linux/Mac
+        pip_path = os.path.join(venv_path, "bin", "pip")
+        activate_path = os.path.join(venv_path, "bin", "activate")
+
+    # Install requirements if they exist
+    if os.path.exists(req_file):
+        try:
+            with span("pip_install"):
+                subprocess.check_call([pip_path, "install", "-r", req_file])
+        except subprocess.CalledProcessError:
+            # Fallback approach if direct pip call fails
+            if os.name == 'nt':
+                activate_cmd = f"{activate_path} && pip install -r {req_file}"
+                subprocess.check_call(activate_cmd, shell=True)
+            else:
+                activate_cmd = f"source {activate_path} && pip install -r {req_file}"
+                subprocess.check_call(activate_cmd, shell=True, executable='/bin/bash')
+
+    with open(os.path.join(venv_path, VENV_MARKER), 'w') as f:
+        f.write(req_hash)
+
+    print(f"✅ Virtual environment set up at {venv_path}")
+    print(f"To activate: {activate_path}")
+
+def prune_venv_cache(keep=None):
+    """
+    Remove shared environments no project set up for VENV_CACHE_MAX_AGE_SECONDS,
+    then the least recently used ones while the cache is over VENV_CACHE_MAX_BYTES
+    """
+    entries = []
+    for entry in os.scandir(VENV_CACHE_DIR):
+        if not entry.is_dir(follow_symlinks=False) or entry.path == keep:
+            continue
+        try:
+            last_used = os.path.getmtime(os.path.join(entry.path, VENV_MARKER))
+        except OSError:
+            # Being built, or an interrupted build the next run rebuilds
+            continue
+        entries.append((last_used, entry.path, directory_size(entry.path)))
+
+    cutoff = time.time() - VENV_CACHE_MAX_AGE_SECONDS
+    total = sum(size for _, _, size in entries) + (directory_size(keep) if keep and os.path.isdir(keep) else 0)
+    for last_used, path, size in sorted(entries):
+        if last_used >= cutoff and total <= VENV_CACHE_MAX_BYTES:
+            break
+        with locked(f"{path}.lock"):
+            try:
+                # A run may have set up a project with it since it was measured
+                if os.path.getmtime(os.path.join(path, VENV_MARKER)) != last_used:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        print(f"🧹 Removed shared virtual environment {os.path.basename(path)}")
+
+@contextmanager
+def locked(lock_path):
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def file_hash(path):
+    """SHA-256 of a file's content"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
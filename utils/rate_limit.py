@@ -0,0 +1,40 @@
+import multiprocessing
+import time
+
+# A token bucket kept in shared memory, so one LLM request budget can be
+# shared by the threads of a worker and by the processes of a batch run.
+# Child processes get the limiter through the pool initializer (see cli.py).
+
+
+class RateLimiter:
+    """
+    Allow at most per_minute calls of acquire() per minute, with bursts of
+    up to burst calls
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60
+        self.capacity = float(burst or max(1, round(self.rate)))
+        # [available tokens, time of the last refill], guarded by the array's lock
+        self._bucket = multiprocessing.Array("d", [self.capacity, time.time()])
+
+    def acquire(self):
+        """
+        Take one token, blocking until one is available
+
+        Returns:
+            The seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._bucket.get_lock():
+                now = time.time()
+                tokens = min(self.capacity, self._bucket[0] + (now - self._bucket[1]) * self.rate)
+                self._bucket[1] = now
+                if tokens >= 1:
+                    self._bucket[0] = tokens - 1
+                    return waited
+                self._bucket[0] = tokens
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
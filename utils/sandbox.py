@@ -0,0 +1,167 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+from utils import metrics
+from utils.config import (
+    SANDBOX_WORKERS,
+    SANDBOX_MAX_JOBS_PER_WORKER,
+    SANDBOX_BATCH_SIZE,
+    SANDBOX_MODULE_TIMEOUT_SECONDS,
+    SANDBOX_MEMORY_LIMIT_BYTES,
+    SANDBOX_CPU_SECONDS,
+)
+from utils.profiling import propagate
+
+# A pool of long-lived sandbox workers (utils/sandbox_worker.py) running in a
+# generated project's venv. Workers are started up front, preload the web
+# frameworks once and fork a resource-limited child per batch of modules, so
+# checking a module costs an import rather than a new interpreter.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+metrics.describe("sandbox_jobs_total", "Batches of modules checked by sandbox workers")
+metrics.describe("sandbox_worker_restarts_total", "Sandbox workers replaced, by reason")
+
+
+def venv_python(venv_dir):
+    if os.name == "nt":
+        return os.path.join(venv_dir, "Scripts", "python.exe")
+    return os.path.join(venv_dir, "bin", "python")
+
+
+class _Worker:
+    def __init__(self, python, project_dir, max_jobs):
+        self.max_jobs = max_jobs
+        self.jobs = 0
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONUNBUFFERED": "1"}
+        self.process = subprocess.Popen(
+            [
+                python, WORKER_SCRIPT, project_dir, str(max_jobs), str(SANDBOX_MODULE_TIMEOUT_SECONDS),
+                str(SANDBOX_MEMORY_LIMIT_BYTES), str(SANDBOX_CPU_SECONDS),
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=project_dir, env=env, text=True,
+        )
+
+    def run(self, items):
+        """Check a batch of items, returns None if the worker died or hung"""
+        # Generous deadline for the whole batch, the worker enforces the per-module timeout
+        deadline = threading.Timer(SANDBOX_MODULE_TIMEOUT_SECONDS * (len(items) + 1) + 30, self.process.kill)
+        deadline.start()
+        try:
+            self.process.stdin.write(json.dumps({"items": items}) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except OSError:
+            line = ""
+        finally:
+            deadline.cancel()
+        self.jobs += 1
+        metrics.inc("sandbox_jobs_total")
+        try:
+            return json.loads(line)["results"]
+        except (ValueError, KeyError):
+            return None
+
+    @property
+    def exhausted(self):
+        return self.jobs >= self.max_jobs or self.process.poll() is not None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class SandboxPool:
+    """
+    Import-check modules of a project with its venv interpreter
+
+    Usage:
+        with SandboxPool(project_dir, venv_python(venv_dir)) as pool:
+            results = pool.check([{"module": "app.main"}, {"path": "alembic/env.py"}])
+    """
+
+    def __init__(self, project_dir, python=None, size=SANDBOX_WORKERS, max_jobs=SANDBOX_MAX_JOBS_PER_WORKER):
+        self.project_dir = os.path.abspath(project_dir)
+        self.python = python or sys.executable
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._size = max(1, size)
+        for _ in range(self._size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self.python, self.project_dir, self.max_jobs)
+
+    def _run_batch(self, items):
+        worker = self._idle.get()
+        results = None
+        try:
+            results = worker.run(items)
+        finally:
+            # Recycle workers that served their jobs, died or hung
+            if worker.exhausted or results is None:
+                reason = "recycled" if worker.jobs >= worker.max_jobs and results is not None else "died"
+                metrics.inc("sandbox_worker_restarts_total", reason=reason)
+                worker.close()
+                worker = self._spawn()
+            self._idle.put(worker)
+        if results is None:
+            return {
+                item.get("module") or item.get("path"): {"error": "Sandbox worker died or timed out", "origin": None}
+                for item in items
+            }
+        return results
+
+    def check(self, items):
+        """
+        Check items in batches spread over the pool's workers
+
+        Returns:
+            Dict mapping each module name or path to None when it imports
+            (or compiles) cleanly, or to {"error": ..., "origin": ...} where
+            origin is the project file the error was raised in
+        """
+        batches = [items[i:i + SANDBOX_BATCH_SIZE] for i in range(0, len(items), SANDBOX_BATCH_SIZE)]
+        results = {}
+        lock = threading.Lock()
+        pending = queue.Queue()
+        for batch in batches:
+            pending.put(batch)
+
+        def drain():
+            while True:
+                try:
+                    batch = pending.get_nowait()
+                except queue.Empty:
+                    return
+                batch_results = self._run_batch(batch)
+                with lock:
+                    results.update(batch_results)
+
+        threads = [threading.Thread(target=propagate(drain)) for _ in range(min(self._size, len(batches)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
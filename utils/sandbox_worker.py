@@ -0,0 +1,153 @@
+"""
+Sandbox worker, run with the generated project's venv interpreter:
+
+    <venv python> sandbox_worker.py <project dir> <max jobs> <module timeout> <memory bytes> <cpu seconds>
+
+Only uses the standard library, the venv does not have the analyzer's
+dependencies. Reads one job per line on stdin:
+
+    {"items": [{"module": "app.main"}, {"path": "scripts/seed.py"}]}
+
+Modules are imported, paths only compiled. Every job runs in a child forked
+from this process, with resource limits, so the frameworks preloaded here
+are shared and whatever a job imports is thrown away with the child. Replies
+with one line per job:
+
+    {"results": {"app.main": null, "app.models": {"error": "...", "origin": "app/models.py"}}}
+
+The worker exits after <max jobs> jobs so the pool replaces it.
+"""
+import contextlib
+import importlib
+import json
+import os
+import signal
+import sys
+import traceback
+
+# Imported once before forking, most generated modules import them
+PRELOAD = ["fastapi", "pydantic", "sqlalchemy", "sqlalchemy.orm", "starlette", "dotenv"]
+
+
+def item_key(item):
+    return item.get("module") or item.get("path")
+
+
+def error_origin(error, project_dir):
+    """Path, relative to the project, of the innermost traceback frame in the project"""
+    origin = None
+    if isinstance(error, SyntaxError) and error.filename:
+        frames = [error.filename]
+    else:
+        frames = [frame.filename for frame in traceback.extract_tb(error.__traceback__)]
+    for filename in frames:
+        path = os.path.abspath(filename)
+        if path.startswith(project_dir + os.sep):
+            origin = os.path.relpath(path, project_dir)
+    return origin
+
+
+def check_item(item, project_dir, timeout):
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"Import took longer than {timeout} seconds")
+
+    # No SIGALRM on Windows, the pool's job deadline still applies there
+    alarm = getattr(signal, "SIGALRM", None)
+    if alarm:
+        signal.signal(alarm, on_timeout)
+        signal.alarm(timeout)
+    try:
+        if "module" in item:
+            importlib.import_module(item["module"])
+        else:
+            path = os.path.join(project_dir, item["path"])
+            with open(path, "rb") as f:
+                compile(f.read(), path, "exec")
+        return None
+    except BaseException as e:  # SystemExit and friends raised by generated code count too
+        lines = traceback.format_exception_only(type(e), e)
+        return {"error": "".join(lines).strip()[-2000:], "origin": error_origin(e, project_dir)}
+    finally:
+        if alarm:
+            signal.alarm(0)
+
+
+def apply_limits(memory_bytes, cpu_seconds):
+    try:
+        import resource
+    except ImportError:
+        return
+    limits = [(resource.RLIMIT_CPU, cpu_seconds), (resource.RLIMIT_AS, memory_bytes)]
+    for limit, value in limits:
+        if value > 0:
+            try:
+                resource.setrlimit(limit, (value, value))
+            except (ValueError, OSError):
+                pass
+
+
+def run_job(items, project_dir, timeout, memory_bytes, cpu_seconds):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # stdin and stdout carry the protocol, generated code must not touch them
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        apply_limits(memory_bytes, cpu_seconds)
+        with os.fdopen(write_fd, "w") as out:
+            for item in items:
+                # One line per item, so the results before a crash are kept
+                out.write(json.dumps([item_key(item), check_item(item, project_dir, timeout)]) + "\n")
+                out.flush()
+        os._exit(0)
+
+    os.close(write_fd)
+    results = {}
+    with os.fdopen(read_fd, "r") as reply:
+        for line in reply:
+            key, result = json.loads(line)
+            results[key] = result
+    _, status = os.waitpid(pid, 0)
+    for item in items:
+        if item_key(item) not in results:
+            reason = f"signal {os.WTERMSIG(status)}" if os.WIFSIGNALED(status) else f"exit status {os.WEXITSTATUS(status)}"
+            results[item_key(item)] = {
+                "error": f"Sandbox process died ({reason}), probably a resource limit was exceeded",
+                "origin": None,
+            }
+    return results
+
+
+def main():
+    project_dir = os.path.abspath(sys.argv[1])
+    max_jobs, timeout, memory_bytes, cpu_seconds = (int(arg) for arg in sys.argv[2:6])
+
+    # sys.path[0] is this script's directory, the project must not see the analyzer's modules
+    sys.path[0] = project_dir
+    os.chdir(project_dir)
+    sys.dont_write_bytecode = True
+
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+    for _ in range(max_jobs):
+        line = sys.stdin.readline()
+        if not line:
+            break
+        items = json.loads(line)["items"]
+        if hasattr(os, "fork"):
+            results = run_job(items, project_dir, timeout, memory_bytes, cpu_seconds)
+        else:
+            with contextlib.redirect_stdout(sys.stderr):
+                results = {item_key(item): check_item(item, project_dir, timeout) for item in items}
+        sys.stdout.write(json.dumps({"results": results}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
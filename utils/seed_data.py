@@ -0,0 +1,360 @@
+import csv
+import io
+import json
+import random
+import string
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from utils.config import SEED_ROWS_PER_TABLE, SEED_ROWS_OVERRIDES, SEED_BATCH_ROWS
+from utils.db import get_engine
+
+# Synthetic rows for the tables of a DDL plan (see create_tables_from_schema).
+# Parents are filled before the tables referencing them, and every batch of
+# rows is generated into one CSV buffer and streamed with COPY FROM STDIN, so
+# memory stays bounded by SEED_BATCH_ROWS whatever the row count.
+
+WORDS = [
+    "alpha", "beta", "gamma", "delta", "omega", "north", "south", "river", "stone", "cloud",
+    "amber", "cedar", "maple", "swift", "bright", "quiet", "rapid", "solid", "prime", "urban",
+]
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+BASE36_DIGITS = string.digits + string.ascii_lowercase
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def row_counts(tables):
+    """Rows to generate per table: SEED_ROWS_PER_TABLE unless overridden"""
+    overrides = {}
+    for item in SEED_ROWS_OVERRIDES.split(","):
+        if "=" in item:
+            name, count = item.split("=", 1)
+            overrides[name.strip()] = int(count)
+    return {table["name"]: overrides.get(table["name"], SEED_ROWS_PER_TABLE) for table in tables}
+
+
+def references(table):
+    """(column, referenced table, referenced column, required) of every foreign key"""
+    refs = []
+    for col in table["columns"]:
+        if col.get("references") and col["name"] != "id":
+            target_table, _, target_column = col["references"].partition(".")
+            refs.append((col, target_table, target_column or "id", col.get("nullable") is False))
+    return refs
+
+
+def dependency_order(tables):
+    """
+    Sort tables so referenced tables come first
+
+    Tables whose references are all seeded before them come first, then
+    tables that only need their NOT NULL references seeded, their nullable
+    ones are left NULL. When NOT NULL references form a cycle one table of
+    it goes first anyway, and seed_tables skips it.
+
+    Returns:
+        (ordered tables, set of (table, column) references to a table that
+        is not seeded before it)
+    """
+    names = {table["name"] for table in tables}
+    remaining = list(tables)
+    placed = set()
+    ordered = []
+    deferred = set()
+
+    def waiting(table, required_only):
+        return [
+            (col, target) for col, target, _, required in references(table)
+            if target in names and target not in placed and target != table["name"]
+            and (required or not required_only)
+        ]
+
+    # A table's rows cannot reference rows of the same COPY that come later
+    for table in tables:
+        deferred.update(
+            (table["name"], col["name"]) for col, target, _, _ in references(table) if target == table["name"]
+        )
+
+    while remaining:
+        table = (
+            next((t for t in remaining if not waiting(t, False)), None)
+            or next((t for t in remaining if not waiting(t, True)), None)
+            or remaining[0]
+        )
+        deferred.update((table["name"], col["name"]) for col, _ in waiting(table, False))
+        remaining.remove(table)
+        placed.add(table["name"])
+        ordered.append(table)
+    return ordered, deferred
+
+
+def unique_columns(table_name, indexes):
+    columns = set()
+    for index in indexes:
+        if index["table"] == table_name and index["unique"]:
+            columns.update(index["columns"])
+    return columns
+
+
+def base36(n, width):
+    """n in base 36 over exactly width digits, distinct for n below 36 ** width"""
+    digits = []
+    for _ in range(width):
+        n, remainder = divmod(n, 36)
+        digits.append(BASE36_DIGITS[remainder])
+    return "".join(reversed(digits))
+
+
+def value_generator(col, unique, rng, referenced):
+    """
+    Return a function of the row number generating values for a column
+
+    referenced is the (first, last) id range or list of values a foreign key
+    draws from, None when there is none and the column is left NULL
+    """
+    kind = col["kind"]
+    name = col["name"].lower()
+
+    if col.get("references"):
+        if not referenced:
+            return lambda n: None
+        if isinstance(referenced, tuple):
+            low, high = referenced
+            if unique:
+                # One-to-one, seed_tables caps the rows to the parents available
+                return lambda n: low + n % (high - low + 1)
+            return lambda n: rng.randint(low, high)
+        if unique:
+            return lambda n: referenced[n % len(referenced)]
+        return lambda n: rng.choice(referenced)
+    if kind in ("integer", "biginteger", "smallinteger"):
+        top = 32000 if kind == "smallinteger" else 1000
+        return (lambda n: n) if unique else (lambda n: rng.randint(0, top))
+    if kind == "float":
+        return (lambda n: float(n)) if unique else (lambda n: round(rng.uniform(0, 1000), 3))
+    if kind == "numeric":
+        scale = col.get("scale", 2)
+        if unique:
+            # n in units of the last digit, exact whatever the scale
+            return lambda n: str(Decimal(n).scaleb(-scale))
+        top = min(10 ** (col.get("precision", 12) - scale) - 1, 10 ** 6)
+        return lambda n: f"{rng.uniform(0, top):.{scale}f}"
+    if kind == "boolean":
+        return (lambda n: n % 2 == 1) if unique else (lambda n: rng.random() < 0.5)
+    if kind == "date":
+        if unique:
+            return lambda n: (EPOCH + timedelta(days=n)).date().isoformat()
+        return lambda n: (EPOCH + timedelta(days=rng.randint(0, 2000))).date().isoformat()
+    if kind == "datetime":
+        if unique:
+            return lambda n: (EPOCH + timedelta(seconds=n)).isoformat()
+        return lambda n: (EPOCH + timedelta(seconds=rng.randint(0, 2000 * 86400))).isoformat()
+    if kind == "time":
+        if unique:
+            return lambda n: f"{n // 3600:02d}:{n // 60 % 60:02d}:{n % 60:02d}"
+        return lambda n: f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+    if kind == "uuid":
+        return lambda n: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if kind == "json":
+        return lambda n: json.dumps({"seed": n, "tag": rng.choice(WORDS)})
+
+    length = col.get("length", 255) if kind == "string" else 10000
+    if unique:
+        # Readable when it fits, else base 36 which has no "_" or "@" and
+        # cannot collide with the readable form
+        make = (lambda n: f"user{n}@example.com") if "email" in name else (lambda n: f"{name}_{n}")
+        return lambda n: make(n) if len(make(n)) <= length else base36(n, length)
+    if "email" in name:
+        make = lambda n: f"user{n}@example.com"
+    elif kind == "text":
+        make = lambda n: " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+    else:
+        make = lambda n: f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+    return lambda n: make(n)[:length]
+
+
+# Largest row number the unique value generator of a bounded kind handles
+UNIQUE_MAX_ROW = {"boolean": 2, "smallinteger": 2 ** 15 - 1, "integer": 2 ** 31 - 1, "time": 86399}
+
+
+def unique_capacity(col, referenced, first):
+    """
+    Most rows numbered from first a unique column has distinct values for,
+    None when unbounded
+    """
+    if col.get("references"):
+        if isinstance(referenced, tuple):
+            return referenced[1] - referenced[0] + 1
+        return len(referenced or [])
+    kind = col["kind"]
+    top = UNIQUE_MAX_ROW.get(kind)
+    if kind == "numeric":
+        top = 10 ** col.get("precision", 12) - 1
+    elif kind == "string" and col.get("length", 255) < 13:
+        top = 36 ** col.get("length", 255) - 1
+    return None if top is None else max(top - first + 1, 0)
+
+
+def referenced_values(cursor, table_name, column, limit):
+    """Distinct non-NULL values of a referenced column, at most limit of them"""
+    cursor.execute(
+        f"SELECT DISTINCT {quote(column)} FROM {quote(table_name)} WHERE {quote(column)} IS NOT NULL LIMIT %s",
+        (limit,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def next_id(cursor, table_name):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {quote(table_name)}")
+    return cursor.fetchone()[0] + 1
+
+
+def next_row(cursor, table_name):
+    """Number of the first new row of a table without id, past the rows already in it"""
+    cursor.execute(f"SELECT COUNT(*) FROM {quote(table_name)}")
+    return cursor.fetchone()[0] + 1
+
+
+def seed_tables(ddl_plan, counts=None):
+    """
+    Fill the tables of a DDL plan with synthetic rows using COPY
+
+    Args:
+        ddl_plan: Plan returned by create_tables_from_schema
+        counts: Rows per table name, defaults to row_counts()
+
+    Foreign keys draw from the ids seeded for the referenced table, or else
+    from the values already in the referenced column. Tables with a NOT NULL
+    foreign key nothing can be drawn for are skipped, and the rows of a table
+    are capped to the distinct values its unique columns can take. Tables that
+    existed before create_tables_from_schema, or whose rows fail to insert,
+    are skipped with a warning.
+
+    Returns:
+        Rows, seconds and rows per second of every seeded table, and warnings
+        about skipped or capped tables
+    """
+    tables, deferred = dependency_order(ddl_plan.get("tables", []))
+    counts = counts or row_counts(tables)
+    stats = {"tables": [], "total_rows": 0, "warnings": []}
+    # Ids generated for every seeded table, references to them draw from these
+    id_ranges = {}
+
+    def skip(name, reason):
+        stats["warnings"].append(f"{name} not seeded: {reason}")
+        print(f"⚠️ {name} not seeded: {reason}")
+
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        for table in tables:
+            name = table["name"]
+            count = counts.get(name, 0)
+            if count <= 0:
+                continue
+            if not table.get("created", True):
+                # Its real columns may differ from the plan
+                skip(name, "the table already existed")
+                continue
+            try:
+                rng = random.Random(name)
+                unique = unique_columns(name, ddl_plan.get("indexes", []))
+                has_id = any(col["name"] == "id" for col in table["columns"])
+                # Row numbers continue past the rows already in the table
+                first_id = next_id(cursor, name) if has_id else next_row(cursor, name)
+
+                columns = []
+                generators = []
+                problem = None
+                for col in table["columns"]:
+                    if col["name"] == "id":
+                        columns.append(col)
+                        generators.append(lambda n: n)
+                        continue
+                    is_unique = col["name"] in unique or col.get("primary_key")
+                    referenced = None
+                    if col.get("references"):
+                        target_table, _, target_column = col["references"].partition(".")
+                        required = col.get("nullable") is False
+                        if (name, col["name"]) in deferred:
+                            if not required:
+                                # Left NULL, the referenced rows may not exist yet
+                                continue
+                            if target_table == name and target_column == "id" and has_id:
+                                # Every row references itself
+                                columns.append(col)
+                                generators.append(lambda n: n)
+                                continue
+                            problem = f"NOT NULL {col['name']} references {target_table}, which is seeded after it"
+                            break
+                        if target_column == "id" and target_table in id_ranges:
+                            referenced = id_ranges[target_table]
+                        else:
+                            # Rows of a table not seeded in this run, or a key other than id
+                            referenced = referenced_values(
+                                cursor, target_table, target_column, count if is_unique else SEED_BATCH_ROWS
+                            )
+                        if not referenced and required:
+                            problem = f"NOT NULL {col['name']} references {target_table}, which has no rows"
+                            break
+                    if is_unique:
+                        capacity = unique_capacity(col, referenced, first_id)
+                        if capacity is not None and capacity < count:
+                            if capacity:
+                                stats["warnings"].append(
+                                    f"{name} capped to {capacity} rows, the distinct values of unique {col['name']}"
+                                )
+                            count = capacity
+                    columns.append(col)
+                    generators.append(value_generator(col, is_unique, rng, referenced))
+                if problem:
+                    skip(name, problem)
+                    continue
+                if count <= 0:
+                    skip(name, "no values left for its unique columns")
+                    continue
+
+                column_list = ", ".join(quote(col["name"]) for col in columns)
+                statement = f"COPY {quote(name)} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+                start = time.perf_counter()
+                for batch_start in range(0, count, SEED_BATCH_ROWS):
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    for offset in range(batch_start, min(batch_start + SEED_BATCH_ROWS, count)):
+                        n = first_id + offset
+                        writer.writerow(["" if v is None else v for v in (g(n) for g in generators)])
+                    buffer.seek(0)
+                    cursor.copy_expert(statement, buffer)
+                if has_id:
+                    # Rows were inserted with explicit ids, move the sequence past them
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{quote(name).replace(chr(39), chr(39) * 2)}', 'id'), "
+                        f"(SELECT MAX(id) FROM {quote(name)}))"
+                    )
+                connection.commit()
+                if has_id:
+                    id_ranges[name] = (first_id, first_id + count - 1)
+            except Exception as e:
+                # The failed statement aborted the transaction, the next table starts a new one
+                connection.rollback()
+                skip(name, str(e).strip())
+                continue
+
+            seconds = time.perf_counter() - start
+            stats["tables"].append({
+                "table": name,
+                "rows": count,
+                "seconds": round(seconds, 3),
+                "rows_per_second": round(count / seconds) if seconds else None,
+            })
+            stats["total_rows"] += count
+            print(f"🌱 Seeded {count} rows into {name} in {seconds:.2f}s")
+    finally:
+        connection.close()
+    return stats
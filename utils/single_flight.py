@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from utils.config import SINGLE_FLIGHT_DIR, SINGLE_FLIGHT_RESULT_TTL
+
+try:
+    import fcntl
+except ImportError:  # Windows, coalescing is then limited to the current worker
+    fcntl = None
+
+# Concurrent calls with the same key run fn only once. Within a worker the
+# duplicates wait on the leader's future. Across workers an exclusive file
+# lock serializes them, and the leader stores its result for SINGLE_FLIGHT_RESULT_TTL
+# seconds so the workers that were waiting on the lock pick it up instead of
+# running again.
+
+_lock = threading.Lock()
+_inflight = {}
+
+
+def single_flight(key, fn):
+    """
+    Run fn() once for all concurrent calls with the same key
+
+    Returns:
+        The result of fn(), shared by every caller. Results must be JSON
+        serializable dicts.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        print(f"🔗 Attaching to in-flight analysis {key}")
+        return future.result()
+
+    try:
+        result = _run_across_workers(key, fn)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def _run_across_workers(key, fn):
+    if fcntl is None:
+        return fn()
+
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    result_path = os.path.join(SINGLE_FLIGHT_DIR, f"{key}.json")
+    with open(os.path.join(SINGLE_FLIGHT_DIR, f"{key}.lock"), "a") as lock_file:
+        # Blocks while another worker runs the same analysis
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            result = _read_result(result_path)
+            if result is not None:
+                print(f"🔗 Reusing result of analysis {key} from another worker")
+                return result
+
+            result = fn()
+            if isinstance(result, dict) and result.get("status") == "success":
+                _write_result(result_path, result)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_result(path):
+    try:
+        if time.time() - os.path.getmtime(path) > SINGLE_FLIGHT_RESULT_TTL:
+            os.remove(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_result(path, result):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
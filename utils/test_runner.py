@@ -0,0 +1,245 @@
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+from utils.config import TEST_WORKERS, TEST_FILE_TIMEOUT_SECONDS, TEST_CACHE_DIR
+from utils.profiling import propagate
+from utils.sandbox import venv_python
+
+# Runs the generated pytest suite in the project's venv, one pytest process
+# per test file spread over TEST_WORKERS cores. The result of a test file is
+# cached under the hash of the file, the project modules it imports
+# (transitively), the conftest.py files that apply to it and requirements.txt,
+# so only the test files affected by a change run again.
+
+metrics.describe("generated_test_files_total", "Generated test files run, by outcome")
+metrics.describe("generated_test_cache_hits_total", "Generated test files whose cached result was reused")
+
+
+def test_files(project_dir):
+    files = []
+    for root, dirs, names in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if d not in ("venv", "__pycache__") and not d.startswith("."))
+        for name in sorted(names):
+            if name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py")):
+                files.append(os.path.relpath(os.path.join(root, name), project_dir))
+    return files
+
+
+def resolve_module(project_dir, module):
+    """Project file of a dotted module name, or None for third-party modules"""
+    base = os.path.join(project_dir, *module.split("."))
+    for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(candidate):
+            return os.path.relpath(candidate, project_dir)
+    return None
+
+
+def imported_files(project_dir, relative_path):
+    """Project files imported by a file, with the packages they are in"""
+    try:
+        with open(os.path.join(project_dir, relative_path), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return set()
+
+    package = os.path.dirname(relative_path).replace(os.sep, ".")
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split(".") if package else []
+                parts = parts[:len(parts) - node.level + 1]
+                base = ".".join(parts + ([node.module] if node.module else []))
+            else:
+                base = node.module or ""
+            modules.append(base)
+            # "from app import models" may import a submodule
+            modules += [f"{base}.{alias.name}" if base else alias.name for alias in node.names]
+
+    files = set()
+    for module in modules:
+        parts = [part for part in module.split(".") if part]
+        for i in range(1, len(parts) + 1):
+            path = resolve_module(project_dir, ".".join(parts[:i]))
+            if path:
+                files.add(path)
+    return files
+
+
+def code_under_test(project_dir, relative_path):
+    """The test file and every project file it depends on"""
+    seen = {relative_path}
+    stack = [relative_path]
+    while stack:
+        for path in imported_files(project_dir, stack.pop()):
+            if path not in seen:
+                seen.add(path)
+                stack.append(path)
+
+    # conftest.py files from the project root down to the test's directory
+    directory = os.path.dirname(relative_path)
+    while True:
+        conftest = os.path.join(directory, "conftest.py")
+        if os.path.isfile(os.path.join(project_dir, conftest)) and conftest not in seen:
+            seen.add(conftest)
+            stack.append(conftest)
+        if not directory:
+            break
+        directory = os.path.dirname(directory)
+    while stack:
+        for path in imported_files(project_dir, stack.pop()):
+            if path not in seen:
+                seen.add(path)
+                stack.append(path)
+    return sorted(seen)
+
+
+def cache_key(project_dir, relative_path):
+    digest = hashlib.sha256()
+    for path in code_under_test(project_dir, relative_path) + ["requirements.txt"]:
+        full_path = os.path.join(project_dir, path)
+        if os.path.isfile(full_path):
+            digest.update(path.encode("utf-8") + b"\0")
+            with open(full_path, "rb") as f:
+                digest.update(f.read())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_cached(key):
+    try:
+        with open(os.path.join(TEST_CACHE_DIR, f"{key}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached(key, result):
+    os.makedirs(TEST_CACHE_DIR, exist_ok=True)
+    path = os.path.join(TEST_CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def parse_junit(path):
+    """Counts and failures from a pytest JUnit XML report"""
+    counts = {"tests": 0, "passed": 0, "failed": 0, "errors": 0, "skipped": 0}
+    failures = []
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return counts, failures
+    for case in root.iter("testcase"):
+        counts["tests"] += 1
+        outcome = "passed"
+        for child in case:
+            if child.tag in ("failure", "error", "skipped"):
+                outcome = {"failure": "failed", "error": "errors", "skipped": "skipped"}[child.tag]
+                if child.tag != "skipped":
+                    failures.append({
+                        "test": f"{case.get('classname')}::{case.get('name')}",
+                        "message": (child.get("message") or "")[:500],
+                    })
+                break
+        counts[outcome] += 1
+    return counts, failures
+
+
+def run_test_file(project_dir, python, relative_path):
+    with tempfile.TemporaryDirectory() as tmp:
+        report = os.path.join(tmp, "report.xml")
+        start = time.monotonic()
+        try:
+            result = subprocess.run(
+                [python, "-m", "pytest", "-q", "-p", "no:cacheprovider", f"--junitxml={report}", relative_path],
+                cwd=project_dir,
+                env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+                capture_output=True,
+                text=True,
+                timeout=TEST_FILE_TIMEOUT_SECONDS,
+            )
+        except subprocess.TimeoutExpired:
+            return {
+                "file": relative_path,
+                "status": "timeout",
+                "duration_seconds": round(time.monotonic() - start, 3),
+                "message": f"Timed out after {TEST_FILE_TIMEOUT_SECONDS} seconds",
+            }
+        duration = round(time.monotonic() - start, 3)
+        counts, failures = parse_junit(report)
+
+    # pytest exit codes: 0 all passed, 1 some failed, 5 no tests collected
+    if result.returncode in (0, 1, 5):
+        status = "passed" if result.returncode in (0, 5) else "failed"
+    else:
+        status = "error"
+    outcome = {"file": relative_path, "status": status, "duration_seconds": duration, **counts}
+    if failures:
+        outcome["failures"] = failures
+    if status == "error":
+        outcome["message"] = (result.stdout + result.stderr).strip()[-2000:]
+    return outcome
+
+
+def run_project_tests(project_dir, venv_dir):
+    """
+    Run the generated test files in parallel in the project's virtual environment
+
+    Returns:
+        Totals plus the outcome and duration of every test file
+    """
+    python = venv_python(venv_dir)
+    files = test_files(project_dir)
+    start = time.monotonic()
+
+    outcomes = {}
+    to_run = []
+    for path in files:
+        key = cache_key(project_dir, path)
+        cached = load_cached(key)
+        if cached is not None:
+            metrics.inc("generated_test_cache_hits_total")
+            outcomes[path] = {**cached, "cached": True}
+        else:
+            to_run.append((path, key))
+
+    if to_run and os.path.exists(python):
+        # Longest files first, so a big file does not start last
+        to_run.sort(key=lambda item: -os.path.getsize(os.path.join(project_dir, item[0])))
+        with ThreadPoolExecutor(max_workers=max(1, TEST_WORKERS)) as executor:
+            futures = {path: (key, executor.submit(propagate(run_test_file), project_dir, python, path)) for path, key in to_run}
+            for path, (key, future) in futures.items():
+                outcome = future.result()
+                metrics.inc("generated_test_files_total", outcome=outcome["status"])
+                # Timeouts may be transient, only definite outcomes are cached
+                if outcome["status"] in ("passed", "failed"):
+                    store_cached(key, outcome)
+                outcomes[path] = {**outcome, "cached": False}
+    elif to_run:
+        for path, _ in to_run:
+            outcomes[path] = {"file": path, "status": "error", "message": f"Interpreter not found: {python}", "cached": False}
+
+    results = [outcomes[path] for path in files]
+    summary = {
+        "files": len(results),
+        "passed_files": sum(1 for r in results if r["status"] == "passed"),
+        "failed_files": sum(1 for r in results if r["status"] != "passed"),
+        "tests_passed": sum(r.get("passed", 0) for r in results),
+        "tests_failed": sum(r.get("failed", 0) + r.get("errors", 0) for r in results),
+        "cached_files": sum(1 for r in results if r["cached"]),
+        "duration_seconds": round(time.monotonic() - start, 3),
+        "results": results,
+    }
+    print(f"🧪 {summary['passed_files']}/{summary['files']} test files passed ({summary['cached_files']} cached) in {summary['duration_seconds']}s")
+    return summary
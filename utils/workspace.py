@@ -0,0 +1,223 @@
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from utils.config import (
+    WORKSPACE_ROOT,
+    WORKSPACE_RUN_QUOTA_BYTES,
+    WORKSPACE_TOTAL_QUOTA_BYTES,
+    WORKSPACE_MAX_AGE_SECONDS,
+    WORKSPACE_GC_INTERVAL_SECONDS,
+)
+
+# Every run gets its own directory under WORKSPACE_ROOT:
+#   <run id>/project/        generated FastAPI project
+#   <run id>/project/venv    link to its virtual environment, shared by the
+#                            projects with the same requirements.txt
+#   <run id>/docs/           generated documentation
+# A ".last_used" file tracks recency for LRU eviction and an ".active" file
+# holding the owner's pid protects workspaces of runs still in progress.
+
+LAST_USED_FILE = ".last_used"
+ACTIVE_FILE = ".active"
+
+_gc_lock = threading.Lock()
+_gc_thread = None
+
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+
+def workspace_paths(workspace_id):
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', workspace_id or ""):
+        raise ValueError(f"Invalid workspace id: {workspace_id}")
+    root = os.path.join(WORKSPACE_ROOT, workspace_id)
+    return {
+        "id": workspace_id,
+        "root": root,
+        "project_dir": os.path.join(root, "project"),
+        "venv_dir": os.path.join(root, "project", "venv"),
+        "docs_dir": os.path.join(root, "docs"),
+    }
+
+
+def get_workspace(workspace_id):
+    """Return the paths of an existing workspace, or None"""
+    try:
+        workspace = workspace_paths(workspace_id)
+    except ValueError:
+        return None
+    return workspace if os.path.isdir(workspace["root"]) else None
+
+
+def create_workspace(workspace_id):
+    """
+    Create (or reopen) the workspace of a run
+
+    Old workspaces are garbage collected first if the global quota is
+    exceeded. Raises WorkspaceQuotaExceeded if there is still no room.
+    """
+    workspace = workspace_paths(workspace_id)
+    if not os.path.isdir(workspace["root"]):
+        if directory_size(WORKSPACE_ROOT) > WORKSPACE_TOTAL_QUOTA_BYTES:
+            collect_garbage()
+            if directory_size(WORKSPACE_ROOT) > WORKSPACE_TOTAL_QUOTA_BYTES:
+                raise WorkspaceQuotaExceeded(
+                    f"Workspaces use more than {WORKSPACE_TOTAL_QUOTA_BYTES} bytes, try again later"
+                )
+    os.makedirs(workspace["project_dir"], exist_ok=True)
+    os.makedirs(workspace["docs_dir"], exist_ok=True)
+    touch(workspace)
+    return workspace
+
+
+@contextmanager
+def use_workspace(workspace):
+    """Protect a workspace from garbage collection while a run uses it"""
+    active_file = os.path.join(workspace["root"], ACTIVE_FILE)
+    with open(active_file, "w") as f:
+        f.write(str(os.getpid()))
+    try:
+        yield workspace
+    finally:
+        touch(workspace)
+        try:
+            os.remove(active_file)
+        except OSError:
+            pass
+
+
+def touch(workspace):
+    with open(os.path.join(workspace["root"], LAST_USED_FILE), "w") as f:
+        f.write(str(time.time()))
+
+
+def seed_workspace(workspace, source_id):
+    """
+    Copy the project generated for a previous version of the document into a
+    new workspace, so unchanged files do not have to be written again. The
+    virtual environment is not copied, setup_virtual_env links the shared one.
+    Files the new version no longer has are removed after generation.
+    """
+    source = get_workspace(source_id)
+    if source is None or source["id"] == workspace["id"] or os.listdir(workspace["project_dir"]):
+        return False
+    shutil.copytree(
+        source["project_dir"], workspace["project_dir"],
+        ignore=shutil.ignore_patterns("venv", "__pycache__"),
+        symlinks=True, dirs_exist_ok=True,
+    )
+    return True
+
+
+def directory_size(path):
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    return total
+
+
+def check_run_quota(workspace):
+    """Raise WorkspaceQuotaExceeded if a run's workspace is larger than its quota"""
+    size = directory_size(workspace["root"])
+    if size > WORKSPACE_RUN_QUOTA_BYTES:
+        raise WorkspaceQuotaExceeded(
+            f"Workspace {workspace['id']} uses {size} bytes, the limit is {WORKSPACE_RUN_QUOTA_BYTES} bytes"
+        )
+    return size
+
+
+def is_active(root):
+    try:
+        with open(os.path.join(root, ACTIVE_FILE)) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def last_used(root):
+    try:
+        return os.path.getmtime(os.path.join(root, LAST_USED_FILE))
+    except OSError:
+        return os.path.getmtime(root)
+
+
+def collect_garbage():
+    """
+    Remove workspaces older than WORKSPACE_MAX_AGE_SECONDS, then the least
+    recently used ones until the total size is under WORKSPACE_TOTAL_QUOTA_BYTES
+
+    Returns:
+        List of removed workspace ids
+    """
+    with _gc_lock:
+        if not os.path.isdir(WORKSPACE_ROOT):
+            return []
+
+        workspaces = []
+        for entry in os.scandir(WORKSPACE_ROOT):
+            if entry.is_dir(follow_symlinks=False) and not is_active(entry.path):
+                workspaces.append({
+                    "id": entry.name,
+                    "root": entry.path,
+                    "last_used": last_used(entry.path),
+                    "size": directory_size(entry.path),
+                })
+        workspaces.sort(key=lambda w: w["last_used"])
+
+        total = directory_size(WORKSPACE_ROOT)
+        now = time.time()
+        removed = []
+        for workspace in workspaces:
+            expired = now - workspace["last_used"] > WORKSPACE_MAX_AGE_SECONDS
+            if not expired and total <= WORKSPACE_TOTAL_QUOTA_BYTES:
+                continue
+            shutil.rmtree(workspace["root"], ignore_errors=True)
+            total -= workspace["size"]
+            removed.append(workspace["id"])
+
+        if removed:
+            print(f"🧹 Removed {len(removed)} old workspaces")
+        return removed
+
+
+def start_gc_thread(interval=WORKSPACE_GC_INTERVAL_SECONDS):
+    """Garbage collect workspaces periodically in a background thread"""
+    global _gc_thread
+    if _gc_thread is not None:
+        return _gc_thread
+
+    def loop():
+        while True:
+            try:
+                collect_garbage()
+            except Exception as e:
+                print(f"❌ Workspace garbage collection failed: {str(e)}")
+            time.sleep(interval)
+
+    _gc_thread = threading.Thread(target=loop, name="workspace-gc", daemon=True)
+    _gc_thread.start()
+    return _gc_thread